@@ -1,13 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
 
 from app.core.config import get_settings
-from app.rag.orchestrator import RAGOrchestrator
+from app.rag.orchestrator import RAGOrchestrator, peek_rag_orchestrator
 from app.llm.ollama import OllamaClient
 
 router = APIRouter()
 
+def get_ready_rag_orchestrator() -> RAGOrchestrator:
+    """読み込み済みのRAGオーケストレーターを取得（起動中は503を返す）"""
+    rag = peek_rag_orchestrator()
+    if rag is None:
+        raise HTTPException(status_code=503, detail="モデルとインデックスを読み込み中です")
+    return rag
+
 class ChatRequest(BaseModel):
     query: str
     history: Optional[List[dict]] = None
@@ -16,13 +23,51 @@ class ChatResponse(BaseModel):
     answer: str
     sources: List[str]
 
+class SearchFilter(BaseModel):
+    """検索対象のページの絞り込み（page_ids と titles の両方を指定した場合は、どちらかに一致するページを対象とする（和集合））"""
+    page_ids: Optional[List[str]] = None
+    titles: Optional[List[str]] = None  # 完全一致
+
+class SearchRequest(SearchFilter):
+    query: str
+    top_k: Optional[int] = Field(None, ge=1)
+
+class BatchSearchRequest(SearchFilter):
+    queries: List[str]
+    top_k: Optional[int] = Field(None, ge=1)
+    
+    @field_validator("queries")
+    @classmethod
+    def limit_queries(cls, queries: List[str]) -> List[str]:
+        """1回の埋め込み・検索のバッチが大きくなりすぎないよう、クエリ数を設定値で制限する（超えた場合は422）"""
+        max_batch_queries = get_settings().max_batch_queries
+        if len(queries) > max_batch_queries:
+            raise ValueError(f"queriesは{max_batch_queries}件以下で指定してください（{len(queries)}件）")
+        return queries
+
+class SearchHit(BaseModel):
+    content: str
+    score: float  # L2距離（小さいほど類似）
+    page_id: str
+    title: str
+    url: str
+    chunk_id: int
+
+class SearchResponse(BaseModel):
+    results: List[SearchHit]
+
+class BatchSearchResponse(BaseModel):
+    results: List[List[SearchHit]]
+
+# 検索・生成はブロッキング処理のため、同期関数としてスレッドプールで実行する
+# （async defにするとイベントループが止まり、ヘルスチェックにも応答できなくなる）
 @router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+def chat_endpoint(request: ChatRequest):
     """チャットエンドポイント - ユーザーの質問に回答"""
     settings = get_settings()
     
-    # RAGオーケストレーターの初期化
-    rag = RAGOrchestrator()
+    # RAGオーケストレーターの取得
+    rag = get_ready_rag_orchestrator()
     
     # 関連コンテキストを取得
     contexts, sources = rag.retrieve(request.query)
@@ -33,4 +78,39 @@ async def chat_endpoint(request: ChatRequest):
     # 回答の生成
     answer = llm.generate_response(request.query, contexts, history=request.history)
     
-    return ChatResponse(answer=answer, sources=sources)
\ No newline at end of file
+    return ChatResponse(answer=answer, sources=sources)
+
+@router.post("/search", response_model=SearchResponse)
+def search_endpoint(request: SearchRequest):
+    """検索エンドポイント - LLMを使わずに関連チャンクを返す"""
+    rag = get_ready_rag_orchestrator()
+    
+    hits = rag.search(
+        request.query,
+        k=request.top_k,
+        page_ids=request.page_ids,
+        titles=request.titles,
+    )
+    
+    return SearchResponse(results=[SearchHit(**hit) for hit in hits])
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+def batch_search_endpoint(request: BatchSearchRequest):
+    """一括検索エンドポイント - 複数クエリをまとめて埋め込み・検索"""
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="queriesが空です")
+    
+    rag = get_ready_rag_orchestrator()
+    
+    batch_hits = rag.search_batch(
+        request.queries,
+        k=request.top_k,
+        page_ids=request.page_ids,
+        titles=request.titles,
+    )
+    
+    # 検索に失敗した場合もクエリ数と同じ長さで返す
+    if len(batch_hits) != len(request.queries):
+        batch_hits = [[] for _ in request.queries]
+    
+    return BatchSearchResponse(results=[[SearchHit(**hit) for hit in hits] for hits in batch_hits])
\ No newline at end of file
@@ -6,6 +6,8 @@ class Settings(BaseSettings):
     # Notion API設定
     notion_token: str
     notion_page_id: Optional[str] = None  # 親ページID
+    notion_cache_mode: str = "off"  # Notionレスポンスのキャッシュ（off / record / replay）
+    notion_cache_path: str = "data/notion_cache.sqlite3"
     
     # LLM設定
     llm_model: str = "qwen3:4b"  # より軽量なgemma:2bモデルを使用
@@ -16,15 +18,37 @@ class Settings(BaseSettings):
     
     # ベクトルストア設定
     vector_store_path: str = "data"
+    snapshot_keep: int = 3  # 保持するスナップショット数
+    index_type: str = "flat"  # FAISSインデックスの種類（flat / hnsw / ivf）
+    hnsw_ef_search: int = 64  # HNSWの検索時の探索幅
+    ivf_nprobe: int = 16  # IVFの検索時に探索するクラスタ数
+    
+    # Notion同期設定
+    sync_interval: int = 0  # 差分同期の間隔（秒）。0の場合は無効
+    sync_full_scan_interval: int = 86400  # すべてのページを確認して削除・共有の解除を検出する間隔（秒）。それ以外は検索APIで変更を検出する
+    sync_max_removed_ratio: float = 0.5  # 1回の同期で削除を許容するページの割合（超える場合はスナップショットを公開しない）
+    
+    # メトリクス設定
+    metrics_enabled: bool = True  # /metrics でPrometheus形式のメトリクスを公開する
     
     # RAG設定
     chunk_size: int = 300
     chunk_overlap: int = 30
     top_k: int = 5
+    max_batch_queries: int = 64  # 一括検索APIで1回に受け付けるクエリ数の上限
+    
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+
+class NotionCacheSettings(BaseSettings):
+    """Notionトークンなしで読み込めるキャッシュの設定（合成ワークスペースの生成などオフラインのスクリプト向け）"""
+    notion_cache_path: str = Settings.model_fields["notion_cache_path"].default
     
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
+        extra = "ignore"
 
 @lru_cache()
 def get_settings():
@@ -0,0 +1,25 @@
+import importlib.util
+import sys
+from types import ModuleType
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    モジュールを最初の属性アクセス時まで読み込まずに返す
+    
+    faissやtorchなど読み込みに時間のかかるモジュールを起動時に読み込まないために使う。
+    
+    Args:
+        name: モジュール名
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
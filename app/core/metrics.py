@@ -0,0 +1,129 @@
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import get_settings
+
+# レイテンシのバケット（FAISS検索のミリ秒未満からLLM生成の数十秒まで）
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+# 無効時に返す何もしないコンテキストマネージャ
+_NULL_TIMER = nullcontext()
+
+_enabled: Optional[bool] = None
+_init_lock = threading.Lock()
+_stage_seconds: Dict[str, Any] = {}
+_metrics: Dict[str, Any] = {}
+
+def is_enabled() -> bool:
+    """メトリクスが有効か（初回呼び出し時に設定を読み込んで初期化）"""
+    global _enabled
+    if _enabled is None:
+        with _init_lock:
+            if _enabled is None:
+                enabled = get_settings().metrics_enabled
+                if enabled:
+                    _initialize()
+                _enabled = enabled
+    return _enabled
+
+def _initialize() -> None:
+    """Prometheusのメトリクスを登録（有効時のみprometheus_clientを読み込む）"""
+    from prometheus_client import Counter, Gauge, Histogram
+    
+    _metrics["stage_seconds"] = Histogram(
+        "rag_stage_seconds",
+        "RAGの各処理段階の所要時間（秒）",
+        ["stage"],
+        buckets=LATENCY_BUCKETS,
+    )
+    _metrics["llm_tokens"] = Counter(
+        "rag_llm_tokens_total",
+        "LLMのトークン数",
+        ["kind"],
+    )
+    _metrics["cache_requests"] = Counter(
+        "rag_cache_requests_total",
+        "キャッシュの参照回数",
+        ["cache", "result"],
+    )
+    _metrics["index_vectors"] = Gauge(
+        "rag_index_vectors",
+        "検索中のインデックスのベクトル数",
+    )
+    _metrics["index_pages"] = Gauge(
+        "rag_index_pages",
+        "検索中のインデックスのページ数",
+    )
+
+class _StageTimer:
+    __slots__ = ("_histogram", "_start")
+    
+    def __init__(self, histogram: Any):
+        self._histogram = histogram
+        self._start = 0.0
+    
+    def __enter__(self) -> "_StageTimer":
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._start)
+
+def stage_timer(stage: str):
+    """
+    処理段階の所要時間を計測するコンテキストマネージャを返す
+    
+    Args:
+        stage: 段階名（embed_query, faiss_search など）
+    """
+    if not is_enabled():
+        return _NULL_TIMER
+    histogram = _stage_seconds.get(stage)
+    if histogram is None:
+        histogram = _stage_seconds[stage] = _metrics["stage_seconds"].labels(stage=stage)
+    return _StageTimer(histogram)
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """計測済みの所要時間を記録"""
+    if is_enabled():
+        _metrics["stage_seconds"].labels(stage=stage).observe(seconds)
+
+def record_tokens(prompt_tokens: int, completion_tokens: int) -> None:
+    """LLMのトークン数を記録"""
+    if is_enabled():
+        _metrics["llm_tokens"].labels(kind="prompt").inc(prompt_tokens)
+        _metrics["llm_tokens"].labels(kind="completion").inc(completion_tokens)
+
+def record_cache(cache: str, hit: bool) -> None:
+    """キャッシュのヒット・ミスを記録"""
+    if is_enabled():
+        _metrics["cache_requests"].labels(cache=cache, result="hit" if hit else "miss").inc()
+
+def track_index(get_vector_store: Callable[[], Any]) -> None:
+    """
+    インデックスサイズをスクレイプ時に取得するよう登録
+    
+    Args:
+        get_vector_store: 検索中のベクトルストアを返す関数（同期による差し替えに追従する。未読み込みの場合はNone）
+    """
+    def index_vectors() -> int:
+        vector_store = get_vector_store()
+        return vector_store.get_index_size() if vector_store is not None else 0
+    
+    def index_pages() -> int:
+        vector_store = get_vector_store()
+        return len(vector_store.page_ranges) if vector_store is not None else 0
+    
+    if is_enabled():
+        _metrics["index_vectors"].set_function(index_vectors)
+        _metrics["index_pages"].set_function(index_pages)
+
+def render_latest() -> Tuple[bytes, str]:
+    """Prometheusのテキスト形式でメトリクスを出力（本文, Content-Type）"""
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+    return generate_latest(), CONTENT_TYPE_LATEST
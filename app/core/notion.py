@@ -1,14 +1,25 @@
-from notion_client import Client
-from typing import List, Dict, Any, Optional
+from notion_client import Client, APIErrorCode, APIResponseError
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Set
+from datetime import datetime, timedelta, timezone
 import logging
 
 from app.core.config import get_settings
+from app.core.notion_cache import NotionResponseStore, CachingNotionClient, is_fetched_after_edit, parse_time
+
+# 検索APIのインデックスへの反映の遅れを見込んで、前回の同期より少し前から変更を探す
+SEARCH_INDEX_LAG = timedelta(minutes=5)
 
 class NotionAPI:
     def __init__(self, token: Optional[str] = None):
         settings = get_settings()
-        self.client = Client(auth=token or settings.notion_token)
         self.logger = logging.getLogger(__name__)
+        self.client = Client(auth=token or settings.notion_token)
+        
+        # レスポンスの記録・再生（オフラインでの再構築やベンチマーク用）
+        if settings.notion_cache_mode in ("record", "replay"):
+            store = NotionResponseStore(settings.notion_cache_path)
+            self.client = CachingNotionClient(store, mode=settings.notion_cache_mode, client=self.client)
+            self.logger.info(f"Notionレスポンスのキャッシュを使用します（モード: {settings.notion_cache_mode}、保存先: {settings.notion_cache_path}）")
     
     def get_page_content(self, page_id: str) -> Dict[str, Any]:
         """ページの内容を取得"""
@@ -46,40 +57,217 @@ class NotionAPI:
             # ページのコンテンツを取得
             blocks = self.get_page_content(page_id)
             
-            # ページのタイトルを取得
-            title = "不明なページ"
-            try:
-                if "properties" in page_info and "title" in page_info["properties"]:
-                    title_property = page_info["properties"]["title"]
-                    title = title_property["title"][0]["plain_text"]
-            except (KeyError, IndexError):
-                pass
-            
-            # ページURLの構築
-            # APIではハイフン付きで変えるので、URLを構築する際にハイフンを削除
-            page_url = f"https://notion.so/{page_id.replace('-', '')}"
-            
-            # テキストを抽出
-            text = self.extract_text_from_blocks(blocks)
-            
             # 現在のページ情報を結果リストに追加
-            result.append({
-                "id": page_id,
-                "title": title,
-                "url": page_url,
-                "content": text
-            })
+            page = self._build_page(page_id, page_info, blocks)
+            result.append(page)
             
             # 子ページを再帰的に取得
-            for block in blocks.get("results", []):
-                if block.get("type") == "child_page":
-                    child_page_id = block.get("id")
-                    # 子ページを再帰的に処理
-                    self._process_page_recursive(child_page_id, result)
+            for child_page_id in page["children"]:
+                # 子ページを再帰的に処理
+                self._process_page_recursive(child_page_id, result)
                     
         except Exception as e:
             self.logger.error(f"ページID {page_id} の処理中にエラーが発生しました: {str(e)}")
     
+    def iter_pages(self, stack: List[str], visited: Set[str]) -> Iterator[Dict[str, Any]]:
+        """
+        探索スタックからページを1件ずつ取得するジェネレータ
+        
+        stackとvisitedはその場で更新されるため、yieldの間に保存しておけば途中から探索を再開できる。
+        存在しない・権限のないページはスキップし、レート制限などの一時的なエラーは呼び出し元へ送出する。
+        
+        Args:
+            stack: 未処理のページIDのスタック
+            visited: 処理済みのページIDの集合
+        """
+        while stack:
+            page_id = stack[-1]
+            if page_id in visited:
+                stack.pop()
+                continue
+            
+            try:
+                page_info = self.client.pages.retrieve(page_id=page_id)
+                blocks = self.client.blocks.children.list(block_id=page_id)
+            except APIResponseError as e:
+                if e.code not in (APIErrorCode.ObjectNotFound, APIErrorCode.Unauthorized, APIErrorCode.RestrictedResource):
+                    raise
+                self.logger.error(f"ページID {page_id} を取得できないためスキップします: {str(e)}")
+                stack.pop()
+                visited.add(page_id)
+                continue
+            
+            # 取得に成功してから状態を更新する（失敗時は同じページから再開できる）
+            page = self._build_page(page_id, page_info, blocks)
+            stack.pop()
+            visited.add(page_id)
+            # 親ページから順に処理されるよう逆順で積む
+            stack.extend(reversed(page["children"]))
+            yield page
+    
+    def _build_page(self, page_id: str, page_info: Dict[str, Any], blocks: Dict[str, Any]) -> Dict[str, Any]:
+        """ページ情報とブロックからページ辞書を構築"""
+        # ページのタイトルを取得
+        title = "不明なページ"
+        try:
+            if "properties" in page_info and "title" in page_info["properties"]:
+                title_property = page_info["properties"]["title"]
+                title = title_property["title"][0]["plain_text"]
+        except (KeyError, IndexError):
+            pass
+        
+        # ページURLの構築
+        # APIではハイフン付きで変えるので、URLを構築する際にハイフンを削除
+        page_url = f"https://notion.so/{page_id.replace('-', '')}"
+        
+        # テキストを抽出
+        text = self.extract_text_from_blocks(blocks)
+        
+        return {
+            "id": page_id,
+            "title": title,
+            "url": page_url,
+            "content": text,
+            "last_edited_time": page_info.get("last_edited_time", ""),
+            # 取得した時刻（UTC）。差分同期で同じ分のうちに編集された可能性があるかの判定に使う
+            "fetched_at": datetime.now(timezone.utc).isoformat(),
+            "children": self._get_child_page_ids(blocks),
+        }
+    
+    def _get_child_page_ids(self, blocks: Dict[str, Any]) -> List[str]:
+        """ブロック一覧から子ページIDを抽出"""
+        return [block.get("id") for block in blocks.get("results", []) if block.get("type") == "child_page"]
+    
+    def _is_unchanged(self, known: Optional[Dict[str, Any]], last_edited_time: str) -> bool:
+        """
+        前回同期時からページが変更されていないか
+        
+        last_edited_timeは分単位に丸められるため、前回の取得が同じ分のうちだった場合は、
+        その後の編集でlast_edited_timeが変わらない可能性がある。この場合は変更ありとして取得し直す。
+        """
+        if not known or known.get("last_edited_time") != last_edited_time:
+            return False
+        fetched_after_edit = is_fetched_after_edit(last_edited_time, known.get("fetched_at"))
+        # 取得時刻のない同期状態（従来の形式）はlast_edited_timeの比較のみで判定する
+        return fetched_after_edit is None or fetched_after_edit
+    
+    def _search_edited_pages(self, since: str) -> Dict[str, Dict[str, Any]]:
+        """
+        検索APIで指定時刻以降に編集されたページを取得
+        
+        last_edited_timeの降順に読み、指定時刻（の分からSEARCH_INDEX_LAGだけ前）より前のページが現れた時点で止める。
+        
+        Returns:
+            正規化したページID → ページ情報（pages.retrieve と同じ形式）
+        """
+        since_time = parse_time(since)
+        if since_time is None:
+            raise ValueError(f"前回の同期時刻を解釈できません: {since}")
+        threshold = since_time.replace(second=0, microsecond=0) - SEARCH_INDEX_LAG
+        
+        pages: Dict[str, Dict[str, Any]] = {}
+        start_cursor = None
+        while True:
+            response = self.client.search(
+                filter={"property": "object", "value": "page"},
+                sort={"direction": "descending", "timestamp": "last_edited_time"},
+                page_size=100,
+                **({"start_cursor": start_cursor} if start_cursor else {}),
+            )
+            for page_info in response.get("results", []):
+                edited_at = parse_time(page_info.get("last_edited_time"))
+                if edited_at is not None and edited_at < threshold:
+                    return pages
+                pages[page_info["id"].replace("-", "")] = page_info
+            if not response.get("has_more") or not response.get("next_cursor"):
+                return pages
+            start_cursor = response["next_cursor"]
+    
+    def get_changed_pages(self, known_pages: Dict[str, Dict[str, Any]], since: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """
+        前回同期時から変更されたページを取得
+        
+        since を指定した場合は、検索APIで since 以降に編集されたページだけを調べ、それ以外の既知のページは
+        APIを呼ばずに前回の状態（子ページ一覧）を引き継ぐ。ページ数に比例したAPI呼び出しを避けるためで、
+        子ページの追加・削除は親ページの編集として検出される。検索に現れない削除・共有の解除は
+        since を指定しない全件の確認（呼び出し元が定期的に行う）で検出する。
+        
+        last_edited_timeが前回と同じページはブロックを取得せず、前回の子ページ一覧を使って探索を続ける。
+        ただしlast_edited_timeは分単位のため、前回の取得と同じ分に編集されたページは取得し直す。
+        子ページが存在しない（ObjectNotFound）場合のみ、アーカイブされたページと同様に同期状態から外す（削除扱い）。
+        共有を外された子ページ（RestrictedResource）は前回の同期状態を引き継ぐ。
+        親ページを取得できない場合や認証エラー（Unauthorized）では、すべてのページを削除と誤認しないよう、
+        またそれ以外のエラーでも取得漏れを起こさないよう、握りつぶさずに呼び出し元へ送出する。
+        
+        Args:
+            known_pages: ページID → {"last_edited_time", "fetched_at", "children"} の前回同期状態
+            since: 前回変更を確認した時刻（ISO 8601）。Noneの場合はすべてのページを確認する
+            
+        Returns:
+            (変更・追加されたページのリスト, 今回の同期状態)
+        """
+        settings = get_settings()
+        if not settings.notion_page_id:
+            raise ValueError("親ページIDが設定されていません")
+        
+        # キャッシュ経由のクライアントは検索APIを記録・再生しないため、すべてのページを確認する
+        edited_pages = None
+        if since and known_pages and not isinstance(self.client, CachingNotionClient):
+            edited_pages = self._search_edited_pages(since)
+            self.logger.info(f"検索APIで{len(edited_pages)}ページの編集を検出しました（{since} 以降）")
+        
+        changed_pages: List[Dict[str, Any]] = []
+        page_states: Dict[str, Dict[str, Any]] = {}
+        stack = [settings.notion_page_id]
+        
+        while stack:
+            page_id = stack.pop()
+            if page_id in page_states:
+                continue
+            
+            known = known_pages.get(page_id)
+            if edited_pages is not None and known and page_id.replace("-", "") not in edited_pages:
+                # 検索に現れなかった既知のページは変更なしとして、APIを呼ばずに前回の状態を引き継ぐ
+                page_states[page_id] = known
+                stack.extend(reversed(known.get("children", [])))
+                continue
+            
+            fetched_at = datetime.now(timezone.utc).isoformat()
+            try:
+                page_info = (edited_pages or {}).get(page_id.replace("-", ""))
+                if page_info is None:
+                    page_info = self.client.pages.retrieve(page_id=page_id)
+                # アーカイブ（削除）されたページは同期状態から外す
+                if page_info.get("archived") or page_info.get("in_trash"):
+                    continue
+                
+                last_edited_time = page_info.get("last_edited_time", "")
+                if self._is_unchanged(known, last_edited_time):
+                    children = known.get("children", [])
+                else:
+                    blocks = self.client.blocks.children.list(block_id=page_id)
+                    page = self._build_page(page_id, page_info, blocks)
+                    changed_pages.append(page)
+                    children = page["children"]
+            except APIResponseError as e:
+                if page_id == settings.notion_page_id or e.code not in (APIErrorCode.ObjectNotFound, APIErrorCode.RestrictedResource):
+                    raise
+                if e.code == APIErrorCode.RestrictedResource and known:
+                    # 権限が外れただけで削除とは限らないため、前回の状態のまま残す
+                    self.logger.warning(f"ページID {page_id} にアクセスできないため、前回の同期状態を引き継ぎます: {str(e)}")
+                    page_states[page_id] = known
+                    stack.extend(reversed(known.get("children", [])))
+                    continue
+                # アーカイブされたページと同様に同期状態から外す（子ページも探索しない）
+                self.logger.error(f"ページID {page_id} を取得できないため削除扱いにします: {str(e)}")
+                continue
+            
+            page_states[page_id] = {"last_edited_time": last_edited_time, "fetched_at": fetched_at, "children": children}
+            # 親ページから順に処理されるよう逆順で積む
+            stack.extend(reversed(children))
+        
+        return changed_pages, page_states
+    
     def extract_text_from_blocks(self, blocks: Dict[str, Any]) -> str:
         """Notionブロックからテキストを抽出"""
         text = ""
@@ -0,0 +1,222 @@
+import sqlite3
+import zlib
+import json
+import os
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+
+from app.core.metrics import record_cache
+
+class NotionCacheMissError(Exception):
+    """リプレイモードでキャッシュに存在しないレスポンスを要求した"""
+
+def _normalize_id(object_id: str) -> str:
+    """IDのハイフン有無の揺れを吸収"""
+    return object_id.replace("-", "")
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Notionの日時（ISO 8601）を解釈（解釈できない場合はNone）"""
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (ValueError, AttributeError):
+        return None
+
+def is_fetched_after_edit(last_edited_time: str, fetched_at: Optional[str]) -> Optional[bool]:
+    """
+    取得時刻がlast_edited_timeの分より後か（その取得に、その分のうちの編集がすべて含まれているか）
+    
+    last_edited_timeは分単位に丸められるため、同じ分のうちに取得した内容には、
+    その後の同じ分の編集が含まれていない可能性がある。
+    
+    Returns:
+        判定できる場合はTrue/False、時刻を解釈できない場合はNone
+    """
+    edited_at = parse_time(last_edited_time)
+    fetched = parse_time(fetched_at)
+    if edited_at is None or fetched is None:
+        return None
+    return fetched >= edited_at + timedelta(minutes=1)
+
+class NotionResponseStore:
+    def __init__(self, path: str):
+        """
+        Notion APIレスポンスを圧縮して保存するローカルストア
+        
+        ページはIDごとに最新のレスポンスを、ブロック一覧はページID + last_edited_timeごとに取得時刻とともに保持する。
+        
+        Args:
+            path: SQLiteファイルのパス
+        """
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 同期デーモンのスレッドからも利用されるため、ロックで直列化する
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages (page_id TEXT PRIMARY KEY, last_edited_time TEXT, data BLOB)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blocks ("
+            "block_id TEXT, last_edited_time TEXT, data BLOB, fetched_at TEXT, PRIMARY KEY (block_id, last_edited_time))"
+        )
+        # 取得時刻の列がない従来のストアには列を追加する（既存のエントリは取得時刻なしとして扱う）
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(blocks)")]
+        if "fetched_at" not in columns:
+            self._conn.execute("ALTER TABLE blocks ADD COLUMN fetched_at TEXT")
+        self._conn.commit()
+    
+    @staticmethod
+    def _encode(response: Dict[str, Any]) -> bytes:
+        return zlib.compress(json.dumps(response, ensure_ascii=False).encode("utf-8"))
+    
+    @staticmethod
+    def _decode(data: bytes) -> Dict[str, Any]:
+        return json.loads(zlib.decompress(data).decode("utf-8"))
+    
+    def get_page(self, page_id: str) -> Optional[Dict[str, Any]]:
+        """保存済みのページレスポンスを取得"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM pages WHERE page_id = ?", (_normalize_id(page_id),)
+            ).fetchone()
+        return self._decode(row[0]) if row else None
+    
+    def put_page(self, page_id: str, response: Dict[str, Any], commit: bool = True) -> None:
+        """ページレスポンスを保存（同じIDのレスポンスは上書き）"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (page_id, last_edited_time, data) VALUES (?, ?, ?)",
+                (_normalize_id(page_id), response.get("last_edited_time", ""), self._encode(response)),
+            )
+            if commit:
+                self._conn.commit()
+    
+    def get_blocks(self, block_id: str, last_edited_time: Optional[str] = None, complete_only: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        保存済みのブロック一覧を取得
+        
+        Args:
+            block_id: ブロック（ページ）ID
+            last_edited_time: ページの更新日時。Noneの場合は最後に保存したものを返す
+            complete_only: last_edited_timeの分が過ぎてから取得したもの（同じ分の編集がすべて含まれるもの）のみ返す
+        """
+        with self._lock:
+            if last_edited_time is None:
+                row = self._conn.execute(
+                    "SELECT data, fetched_at FROM blocks WHERE block_id = ? ORDER BY rowid DESC LIMIT 1",
+                    (_normalize_id(block_id),),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT data, fetched_at FROM blocks WHERE block_id = ? AND last_edited_time = ?",
+                    (_normalize_id(block_id), last_edited_time),
+                ).fetchone()
+        if row is None:
+            return None
+        if complete_only and not is_fetched_after_edit(last_edited_time or "", row[1]):
+            return None
+        return self._decode(row[0])
+    
+    def put_blocks(self, block_id: str, last_edited_time: str, response: Dict[str, Any], commit: bool = True, fetched_at: Optional[str] = None) -> None:
+        """ブロック一覧を保存（取得時刻を省略した場合は現在時刻）"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO blocks (block_id, last_edited_time, data, fetched_at) VALUES (?, ?, ?, ?)",
+                (
+                    _normalize_id(block_id),
+                    last_edited_time,
+                    self._encode(response),
+                    fetched_at or datetime.now(timezone.utc).isoformat(),
+                ),
+            )
+            if commit:
+                self._conn.commit()
+    
+    def commit(self) -> None:
+        with self._lock:
+            self._conn.commit()
+    
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+class _PagesEndpoint:
+    def __init__(self, owner: "CachingNotionClient"):
+        self._owner = owner
+    
+    def retrieve(self, page_id: str, **kwargs) -> Dict[str, Any]:
+        owner = self._owner
+        if owner.mode == "replay":
+            response = owner.store.get_page(page_id)
+            if response is None:
+                raise NotionCacheMissError(f"ページ {page_id} がキャッシュにありません")
+        else:
+            # 記録モードではページ情報は常に取得し、更新日時をブロック一覧のキーに使う
+            response = owner.client.pages.retrieve(page_id=page_id, **kwargs)
+            owner.store.put_page(page_id, response)
+        owner.last_edited_times[_normalize_id(page_id)] = response.get("last_edited_time", "")
+        return response
+
+class _BlockChildrenEndpoint:
+    def __init__(self, owner: "CachingNotionClient"):
+        self._owner = owner
+    
+    def list(self, block_id: str, **kwargs) -> Dict[str, Any]:
+        owner = self._owner
+        # ページネーションのカーソルごとに別のエントリとして保存する
+        cache_id = block_id if not kwargs.get("start_cursor") else f"{block_id}:{kwargs['start_cursor']}"
+        last_edited_time = owner.last_edited_times.get(_normalize_id(block_id))
+        
+        if owner.mode == "replay":
+            response = owner.store.get_blocks(cache_id, last_edited_time)
+            record_cache("notion_blocks", response is not None)
+            if response is None:
+                raise NotionCacheMissError(f"ブロック {block_id} がキャッシュにありません")
+            return response
+        
+        # 記録モードでは、last_edited_timeの分のうちに記録したものは、その後の同じ分の編集を含まない可能性があるため使わない
+        if last_edited_time is not None:
+            response = owner.store.get_blocks(cache_id, last_edited_time, complete_only=True)
+            record_cache("notion_blocks", response is not None)
+            if response is not None:
+                return response
+        
+        fetched_at = datetime.now(timezone.utc).isoformat()
+        response = owner.client.blocks.children.list(block_id=block_id, **kwargs)
+        owner.store.put_blocks(cache_id, last_edited_time or "", response, fetched_at=fetched_at)
+        return response
+
+class _BlocksEndpoint:
+    def __init__(self, owner: "CachingNotionClient"):
+        self.children = _BlockChildrenEndpoint(owner)
+
+class CachingNotionClient:
+    def __init__(self, store: NotionResponseStore, mode: str = "record", client: Optional[Any] = None):
+        """
+        notion_client.Clientと同じ呼び出し方で使える記録・再生用のクライアント
+        
+        record: ページ情報は常にAPIから取得して保存し、ブロック一覧は更新日時が同じで、その分が過ぎてから記録したものならキャッシュから返す
+        replay: ネットワークを使わずにキャッシュのみから返す
+        
+        Args:
+            store: レスポンスの保存先
+            mode: "record" または "replay"
+            client: 記録モードで使用するnotion_client.Client
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"不明なキャッシュモードです: {mode}")
+        if mode == "record" and client is None:
+            raise ValueError("記録モードにはNotionクライアントが必要です")
+        self.store = store
+        self.mode = mode
+        self.client = client
+        # ページID → 直近に取得したlast_edited_time
+        self.last_edited_times: Dict[str, str] = {}
+        self.pages = _PagesEndpoint(self)
+        self.blocks = _BlocksEndpoint(self)
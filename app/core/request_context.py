@@ -0,0 +1,30 @@
+import contextvars
+import logging
+import uuid
+from typing import Optional
+
+# ログ出力にリクエストIDを含めるためのフォーマット
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+# 処理中のリクエストID（リクエスト外では "-"）
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+def new_request_id() -> str:
+    """新しいリクエストIDを生成"""
+    return uuid.uuid4().hex[:16]
+
+def bind_request_id(request_id: Optional[str] = None) -> str:
+    """現在のコンテキストにリクエストIDを設定（指定がなければ生成）"""
+    request_id = request_id or new_request_id()
+    request_id_var.set(request_id)
+    return request_id
+
+_default_record_factory = logging.getLogRecordFactory()
+
+def _record_factory(*args, **kwargs) -> logging.LogRecord:
+    """すべてのログレコードに現在のリクエストIDを付与"""
+    record = _default_record_factory(*args, **kwargs)
+    record.request_id = request_id_var.get()
+    return record
+
+logging.setLogRecordFactory(_record_factory)
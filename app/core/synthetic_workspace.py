@@ -0,0 +1,131 @@
+import random
+import uuid
+import logging
+from datetime import datetime, timedelta
+from typing import List, Dict, Any
+
+from app.core.notion_cache import NotionResponseStore
+
+logger = logging.getLogger(__name__)
+
+# 本文の生成に使う語彙（ページごとにトピック語を混ぜて検索の手がかりにする）
+VOCABULARY = [
+    "設定", "インストール", "エラー", "ログ", "データベース", "バックアップ", "認証", "権限",
+    "ネットワーク", "サーバー", "クライアント", "リクエスト", "レスポンス", "キャッシュ", "メモリ",
+    "ディスク", "プロセス", "スレッド", "デプロイ", "テスト", "レビュー", "リリース", "監視",
+    "通知", "ユーザー", "アカウント", "パスワード", "トークン", "API", "エンドポイント",
+    "パフォーマンス", "スケール", "障害", "復旧", "手順", "確認", "実行", "更新", "削除", "作成",
+    "ファイル", "ディレクトリ", "コマンド", "オプション", "環境変数", "コンテナ", "イメージ",
+    "ブラウザ", "画面", "ボタン", "入力", "出力", "検索", "一覧", "詳細", "履歴", "申請", "承認",
+]
+
+TEXT_BLOCK_TYPES = [
+    "paragraph", "paragraph", "paragraph", "heading_2", "heading_3",
+    "bulleted_list_item", "numbered_list_item", "quote", "code",
+]
+
+def _format_id(rng: random.Random) -> str:
+    """NotionのページIDと同じハイフン付きUUID形式のIDを生成"""
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+def _rich_text(text: str) -> List[Dict[str, Any]]:
+    return [{"type": "text", "text": {"content": text}, "plain_text": text}]
+
+def _sentence(rng: random.Random, topic: str) -> str:
+    words = rng.choices(VOCABULARY, k=rng.randint(5, 12))
+    words[rng.randrange(len(words))] = topic
+    return "の".join(words[:2]) + "を" + "、".join(words[2:]) + "します。"
+
+def _text_block(rng: random.Random, topic: str) -> Dict[str, Any]:
+    block_type = rng.choice(TEXT_BLOCK_TYPES)
+    if block_type.startswith("heading"):
+        content = f"{topic}の{rng.choice(VOCABULARY)}"
+    elif block_type == "code":
+        content = f"$ run --{rng.choice(['config', 'verbose', 'dry-run'])} {rng.randint(1, 100)}"
+    else:
+        content = "".join(_sentence(rng, topic) for _ in range(rng.randint(1, 4)))
+    
+    body = {"rich_text": _rich_text(content)}
+    if block_type == "code":
+        body["language"] = "shell"
+    return {"object": "block", "id": _format_id(rng), "type": block_type, block_type: body}
+
+def _page_response(page_id: str, title: str, last_edited_time: str) -> Dict[str, Any]:
+    return {
+        "object": "page",
+        "id": page_id,
+        "last_edited_time": last_edited_time,
+        "archived": False,
+        "properties": {"title": {"id": "title", "type": "title", "title": _rich_text(title)}},
+    }
+
+def generate_workspace(
+    store: NotionResponseStore,
+    page_count: int = 100,
+    max_depth: int = 3,
+    blocks_per_page: int = 20,
+    seed: int = 0,
+) -> str:
+    """
+    合成したNotionワークスペースをレスポンスストアに書き込む
+    
+    記録モードで保存したものと同じ形式になるため、リプレイモードでそのままインデックス構築に使える。
+    
+    Args:
+        store: 書き込み先のレスポンスストア
+        page_count: ページ数（親ページを含む）
+        max_depth: ページ階層の最大の深さ（親ページが0）
+        blocks_per_page: 1ページあたりのテキストブロック数
+        seed: 乱数シード（同じ値なら同じワークスペースを生成する）
+    
+    Returns:
+        親ページのID
+    """
+    rng = random.Random(seed)
+    base_time = datetime(2024, 1, 1)
+    
+    # ページ階層の構築（各ページの親を、深さが上限未満のページから選ぶ）
+    page_ids = [_format_id(rng) for _ in range(page_count)]
+    depths = [0]
+    children: List[List[str]] = [[] for _ in range(page_count)]
+    parent_candidates = [0] if max_depth > 0 else []
+    for i in range(1, page_count):
+        if not parent_candidates:
+            break
+        parent = rng.choice(parent_candidates)
+        children[parent].append(page_ids[i])
+        depths.append(depths[parent] + 1)
+        if depths[i] < max_depth:
+            parent_candidates.append(i)
+    
+    topics = [rng.choice(VOCABULARY) for _ in range(len(depths))]
+    titles = [f"{topic}マニュアル {i}" for i, topic in enumerate(topics)]
+    title_by_id = dict(zip(page_ids, titles))
+    
+    for i in range(len(depths)):
+        topic = topics[i]
+        title = titles[i]
+        last_edited_time = (base_time + timedelta(minutes=rng.randint(0, 525600))).strftime("%Y-%m-%dT%H:%M:00.000Z")
+        
+        results = [_text_block(rng, topic) for _ in range(blocks_per_page)]
+        results.extend(
+            {"object": "block", "id": child_id, "type": "child_page", "child_page": {"title": title_by_id[child_id]}}
+            for child_id in children[i]
+        )
+        
+        store.put_page(page_ids[i], _page_response(page_ids[i], title, last_edited_time), commit=False)
+        store.put_blocks(
+            page_ids[i],
+            last_edited_time,
+            {"object": "list", "results": results, "next_cursor": None, "has_more": False},
+            commit=False,
+        )
+        
+        if (i + 1) % 1000 == 0:
+            store.commit()
+            logger.info(f"{i + 1}ページを生成しました")
+    
+    store.commit()
+    if len(depths) < page_count:
+        logger.warning(f"最大の深さ {max_depth} では {len(depths)} ページまでしか生成できませんでした")
+    return page_ids[0]
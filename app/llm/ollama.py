@@ -1,9 +1,11 @@
 import requests
 import json
 import logging
+import time
 from typing import List, Optional, Dict, Any
 
 from app.core.config import get_settings
+from app.core.metrics import stage_timer, observe_stage, record_tokens
 
 class OllamaClient:
     def __init__(self, model_name: Optional[str] = None):
@@ -15,60 +17,86 @@ class OllamaClient:
     def generate_response(self, query: str, contexts: List[str], history: Optional[List[Dict[str, Any]]] = None) -> str:
         """コンテキストを用いてLLMで回答を生成"""
         try:
-            # コンテキストを結合
-            context_text = "\n\n".join(contexts)
-            
-            # プロンプトの構築
-            prompt = f"""以下は、ユーザーの質問に関連するマニュアルからの情報です：
+            with stage_timer("prompt_build"):
+                # コンテキストを結合
+                context_text = "\n\n".join(contexts)
+                
+                # プロンプトの構築
+                prompt = f"""以下は、ユーザーの質問に関連するマニュアルからの情報です：
 
 {context_text}
 
 ユーザーの質問: {query}
 
 上記の情報に基づいて、ユーザーの質問に明確に答えてください。マニュアルに記載されている情報のみを使用し、情報がない場合はその旨を伝えてください。"""
-            
-            # Ollamaリクエストの準備
-            messages = []
-            
-            # 履歴がある場合は追加
-            if history:
-                for msg in history:
-                    messages.append({
-                        "role": msg.get("role", "user"),
-                        "content": msg.get("content", "")
-                    })
-            
-            # 最後にユーザーの質問を追加
-            messages.append({
-                "role": "user", 
-                "content": prompt
-            })
+                
+                # Ollamaリクエストの準備
+                messages = []
+                
+                # 履歴がある場合は追加
+                if history:
+                    for msg in history:
+                        messages.append({
+                            "role": msg.get("role", "user"),
+                            "content": msg.get("content", "")
+                        })
+                
+                # 最後にユーザーの質問を追加
+                messages.append({
+                    "role": "user", 
+                    "content": prompt
+                })
             
             # Ollamaにリクエスト送信
+            # 最初のトークンまでの時間を計測できるようストリーミングで受信する
             self.logger.info(f"モデル {self.model} にリクエストを送信中...")
-            response = requests.post(
+            start = time.perf_counter()
+            # ストリーミングの接続は読み終えた後・エラー時に確実に閉じる
+            with requests.post(
                 f"{self.api_base}/chat",
                 headers={"Content-Type": "application/json"},
                 data=json.dumps({
                     "model": self.model,
                     "messages": messages,
-                    "stream": False,
+                    "stream": True,
                     "options": {
                         "temperature": 0.7,  # 温度を0.7に変更
                         "num_ctx": 1024,     # コンテキスト長を制限
                         "num_predict": 1024   # 生成トークン数を制限
                     }
                 }),
-                timeout=180  # タイムアウトを60秒に短縮
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result.get("message", {}).get("content", "回答を生成できませんでした。")
-            else:
-                self.logger.error(f"Ollamaエラー: {response.status_code} - {response.text}")
-                return "LLMからの回答取得中にエラーが発生しました。"
+                timeout=180,  # タイムアウトを60秒に短縮
+                stream=True
+            ) as response:
+                if response.status_code == 200:
+                    return self._read_stream(response, start)
+                else:
+                    self.logger.error(f"Ollamaエラー: {response.status_code} - {response.text}")
+                    return "LLMからの回答取得中にエラーが発生しました。"
         
         except Exception as e:
             self.logger.error(f"回答生成中にエラーが発生しました: {str(e)}")
-            return "回答生成中にエラーが発生しました。"
\ No newline at end of file
+            return "回答生成中にエラーが発生しました。"
+    
+    def _read_stream(self, response: requests.Response, start: float) -> str:
+        """ストリーミング応答を結合し、最初のトークンまでの時間・生成時間・トークン数を記録"""
+        parts = []
+        first_token_at = None
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            content = chunk.get("message", {}).get("content", "")
+            if content:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    observe_stage("llm_first_token", first_token_at - start)
+                parts.append(content)
+            if chunk.get("done"):
+                record_tokens(chunk.get("prompt_eval_count", 0), chunk.get("eval_count", 0))
+                break
+        observe_stage("llm_generation", time.perf_counter() - start)
+        
+        if not parts:
+            return "回答を生成できませんでした。"
+        return "".join(parts)
\ No newline at end of file
@@ -1,12 +1,59 @@
 # アプリケーションのエントリーポイント
+# 起動を速くするため、gradio・torch・faissなどの重いモジュールはここでは読み込まない
+import asyncio
+import logging
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-import gradio as gr
+from fastapi.responses import JSONResponse
 
+from app.core import metrics
 from app.core.config import Settings
+from app.core.request_context import LOG_FORMAT, new_request_id, request_id_var
 from app.api.endpoints import router
-from app.ui.gradio_app import create_gradio_app
+from app.rag.orchestrator import get_rag_orchestrator, peek_rag_orchestrator
+
+# ロガーの設定
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+def _load_components():
+    """モデル・インデックスの読み込みとウォームアップ、Gradioアプリの作成（スレッドで実行）"""
+    rag = get_rag_orchestrator()
+    rag.warm_up()
+    
+    from app.ui.gradio_app import create_gradio_app
+    return rag, create_gradio_app()
+
+async def warm_up(app: FastAPI, settings: Settings) -> None:
+    """サーバーが接続を受け付け始めた後に、重い初期化をバックグラウンドで行う"""
+    try:
+        # イベントループを止めないよう、ブロッキングな読み込みはスレッドで行う
+        rag, gradio_app = await asyncio.to_thread(_load_components)
+        
+        # Gradioアプリのマウント（キューはイベントループ上で開始する必要がある）
+        import gradio as gr
+        gr.mount_gradio_app(app, gradio_app, path="/")
+        # mount_gradio_app が登録するstartupイベントは起動後には呼ばれないため、直接開始する
+        gradio_app.startup_events()
+        
+        # Notionの差分同期（有効な場合のみ）
+        if settings.sync_interval > 0:
+            from app.rag.sync import IndexSyncer
+            app.state.syncer = IndexSyncer(rag, interval=settings.sync_interval)
+            app.state.syncer.start()
+        
+        app.state.warmed_up = True
+        if not rag.is_ready():
+            logger.error("インデックスが読み込まれていないため、読み込まれるまでレディネスチェックは失敗します")
+            return
+        
+        logger.info("モデルとインデックスの読み込みが完了しました")
+    except Exception as e:
+        import traceback
+        error_details = traceback.format_exc()
+        app.state.startup_error = str(e)
+        logger.error(f"起動時の初期化中にエラーが発生しました: {str(e)}\n{error_details}")
 
 def create_app():
     # 設定の読み込み
@@ -19,6 +66,11 @@ def create_app():
         version="1.0.0"
     )
     
+    # 起動状態（/readyz 用）
+    app.state.warmed_up = False
+    app.state.startup_error = None
+    app.state.syncer = None
+    
     # CORSミドルウェアの追加
     app.add_middleware(
         CORSMiddleware,
@@ -28,12 +80,58 @@ def create_app():
         allow_headers=["*"],
     )
     
+    # リクエストIDの付与（ヘッダーで渡された場合はそれを引き継ぐ）
+    @app.middleware("http")
+    async def request_id_middleware(request: Request, call_next):
+        request_id = request.headers.get("X-Request-ID") or new_request_id()
+        token = request_id_var.set(request_id)
+        try:
+            response = await call_next(request)
+        finally:
+            request_id_var.reset(token)
+        response.headers["X-Request-ID"] = request_id
+        return response
+    
+    # ヘルスチェック（Gradioを "/" にマウントする前に登録する）
+    @app.get("/healthz", include_in_schema=False)
+    async def healthz():
+        """ライブネス - プロセスが応答できるか"""
+        return {"status": "ok"}
+    
+    @app.get("/readyz", include_in_schema=False)
+    async def readyz():
+        """レディネス - モデルとインデックスの読み込みが完了しているか"""
+        if not app.state.warmed_up:
+            status = "error" if app.state.startup_error else "starting"
+            return JSONResponse(status_code=503, content={"status": status, "detail": app.state.startup_error})
+        # 差分同期などで後からインデックスが読み込まれる場合があるため、毎回確認する
+        rag = peek_rag_orchestrator()
+        if rag is not None and rag.is_ready():
+            return {"status": "ready"}
+        return JSONResponse(status_code=503, content={"status": "no_index", "detail": "インデックスが読み込まれていません"})
+    
     # APIルーターの登録
     app.include_router(router, prefix="/api")
     
-    # Gradioアプリの作成とマウント
-    gradio_app = create_gradio_app()
-    app = gr.mount_gradio_app(app, gradio_app, path="/")
+    # Prometheusメトリクス（Gradioを "/" にマウントする前に登録する）
+    if settings.metrics_enabled:
+        metrics.track_index(lambda: getattr(peek_rag_orchestrator(), "vector_store", None))
+        
+        @app.get("/metrics", include_in_schema=False)
+        async def metrics_endpoint():
+            body, content_type = metrics.render_latest()
+            return Response(content=body, media_type=content_type)
+    
+    # モデル・インデックスの読み込みとGradioのマウントはバックグラウンドで行う
+    async def start_warm_up():
+        app.state.warm_up_task = asyncio.create_task(warm_up(app, settings))
+    
+    def stop_syncer():
+        if app.state.syncer is not None:
+            app.state.syncer.stop()
+    
+    app.add_event_handler("startup", start_warm_up)
+    app.add_event_handler("shutdown", stop_syncer)
     
     return app
 
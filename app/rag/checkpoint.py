@@ -0,0 +1,148 @@
+import numpy as np
+import pickle
+import json
+import os
+import shutil
+import logging
+from typing import List, Dict, Any, Tuple, Optional, Iterator
+
+from app.core.config import get_settings
+
+class BuildCheckpoint:
+    def __init__(self, checkpoint_path: Optional[str] = None):
+        """
+        インデックス構築のチェックポイントを管理
+
+        Args:
+            checkpoint_path: チェックポイントの保存先（Noneの場合は vector_store_path/build_checkpoint）
+        """
+        settings = get_settings()
+        self.logger = logging.getLogger(__name__)
+        self.checkpoint_path = checkpoint_path or f"{settings.vector_store_path}/build_checkpoint"
+        self.state_path = f"{self.checkpoint_path}/state.json"
+        # 差分同期用のページ状態は構築状態に含めず、フラッシュごとに追記する（構築状態は探索の位置だけの小さなものに保つ）
+        self.page_states_path = f"{self.checkpoint_path}/pages.jsonl"
+        # 設定が変わった状態で再開するとチャンクや埋め込みが混在するため、再開時に照合する
+        self.build_settings = {
+            "notion_page_id": settings.notion_page_id,
+            "embedding_model": settings.embedding_model,
+            "chunk_size": settings.chunk_size,
+            "chunk_overlap": settings.chunk_overlap,
+        }
+
+    def exists(self) -> bool:
+        """チェックポイントが存在するか"""
+        return os.path.exists(self.state_path)
+
+    def load_state(self) -> Optional[Dict[str, Any]]:
+        """
+        保存済みの構築状態を読み込み
+
+        Returns:
+            構築状態。存在しない・設定が一致しない場合はNone
+        """
+        if not self.exists():
+            return None
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except Exception as e:
+            self.logger.error(f"チェックポイントの読み込み中にエラーが発生しました: {str(e)}")
+            return None
+
+        if state.get("settings") != self.build_settings:
+            self.logger.error(f"チェックポイント作成時と設定が異なるため再開できません: {state.get('settings')}")
+            return None
+
+        # ページ状態を構築状態に含めていた従来の形式は、追記形式に移す
+        if "pages" in state:
+            self.truncate_page_states(0)
+            state["page_count"] = len(state["pages"])
+            state["page_states_bytes"] = self.append_page_states(state.pop("pages"))
+            self.save_state(state)
+        return state
+
+    def save_state(self, state: Dict[str, Any]) -> None:
+        """構築状態をアトミックに保存"""
+        os.makedirs(self.checkpoint_path, exist_ok=True)
+        state = dict(state, settings=self.build_settings)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+
+    def append_page_states(self, page_states: Dict[str, Dict[str, Any]]) -> int:
+        """
+        差分同期用のページ状態を追記（1行に1ページ）
+
+        Args:
+            page_states: ページID → {"last_edited_time", "fetched_at", "children"}
+
+        Returns:
+            追記後のファイルサイズ（構築状態に保存し、再開時・結合時はこの位置までを有効とする）
+        """
+        os.makedirs(self.checkpoint_path, exist_ok=True)
+        with open(self.page_states_path, "ab") as f:
+            for page_id, page_state in page_states.items():
+                f.write((json.dumps(dict(page_state, id=page_id), ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    def truncate_page_states(self, size: int) -> None:
+        """構築状態の保存より後に追記されたページ状態（中断時に未確定だった分）を切り詰める"""
+        if os.path.exists(self.page_states_path):
+            with open(self.page_states_path, "r+b") as f:
+                f.truncate(size)
+
+    def load_page_states(self, size: int) -> Dict[str, Dict[str, Any]]:
+        """追記したページ状態を先頭から size バイトまで読み込む"""
+        page_states: Dict[str, Dict[str, Any]] = {}
+        if not os.path.exists(self.page_states_path):
+            return page_states
+        with open(self.page_states_path, "rb") as f:
+            data = f.read(size)
+        for line in data.decode("utf-8").splitlines():
+            if line:
+                page_state = json.loads(line)
+                page_states[page_state.pop("id")] = page_state
+        return page_states
+
+    def _shard_paths(self, shard_id: int) -> Tuple[str, str]:
+        base = f"{self.checkpoint_path}/shard-{shard_id:05d}"
+        return f"{base}.pkl", f"{base}.npy"
+
+    def write_shard(self, shard_id: int, documents: List[Dict[str, Any]], embeddings: List[List[float]]) -> None:
+        """
+        チャンクと埋め込みをシャードとして書き出す
+
+        Args:
+            shard_id: シャード番号
+            documents: チャンク（メタデータ付き）
+            embeddings: チャンクの埋め込み
+        """
+        os.makedirs(self.checkpoint_path, exist_ok=True)
+        documents_path, embeddings_path = self._shard_paths(shard_id)
+
+        # 書き込み途中のシャードを読まないよう、一時ファイルから置き換える
+        with open(f"{documents_path}.tmp", "wb") as f:
+            pickle.dump(documents, f)
+        with open(f"{embeddings_path}.tmp", "wb") as f:
+            np.save(f, np.array(embeddings, dtype=np.float32))
+        os.replace(f"{documents_path}.tmp", documents_path)
+        os.replace(f"{embeddings_path}.tmp", embeddings_path)
+
+    def iter_shards(self, shard_count: int) -> Iterator[Tuple[List[Dict[str, Any]], np.ndarray]]:
+        """書き出したシャードを順に読み込む"""
+        for shard_id in range(shard_count):
+            documents_path, embeddings_path = self._shard_paths(shard_id)
+            with open(documents_path, "rb") as f:
+                documents = pickle.load(f)
+            embeddings = np.load(embeddings_path, mmap_mode="r")
+            yield documents, embeddings
+
+    def clear(self) -> None:
+        """チェックポイントを削除"""
+        shutil.rmtree(self.checkpoint_path, ignore_errors=True)
@@ -0,0 +1,235 @@
+import numpy as np
+import json
+import os
+from typing import List, Dict, Any, Tuple
+
+# チャンクレコードの型（ページ番号, ページ内のチャンク番号, 本文バッファ内のバイト位置・長さ, 本文の符号化）
+CHUNK_DTYPE = np.dtype([
+    ("page", np.int32),
+    ("chunk", np.int32),
+    ("offset", np.int64),
+    ("length", np.int32),
+    ("wide", np.bool_),
+])
+
+# 日本語の本文はUTF-8では1文字3バイトになるため、ASCII以外を含むチャンクはUTF-16で格納する
+def _encode(text: str) -> Tuple[bytes, bool]:
+    if text.isascii():
+        return text.encode("ascii"), False
+    return text.encode("utf-16-le"), True
+
+def _decode(data: bytes, wide: bool) -> str:
+    return data.decode("utf-16-le") if wide else data.decode("ascii")
+
+class ChunkTable:
+    def __init__(self):
+        """
+        チャンクのメタデータをコンパクトに保持するテーブル
+        
+        チャンクごとに辞書を持つ代わりに、ページ情報（ID・タイトル・URL）はページ表に1件だけ保持し、
+        チャンクはページ番号・チャンク番号・本文の位置を持つ構造化配列のレコードとして保持する。
+        本文は連結した1つのバッファに格納する。辞書は検索結果として返すチャンクに対してのみ生成する。
+        """
+        # ページ表（ページ番号 → ページID・タイトル・URL）
+        self.page_ids: List[str] = []
+        self.titles: List[str] = []
+        self.urls: List[str] = []
+        # 正規化したページID → ページ番号
+        self._page_numbers: Dict[str, int] = {}
+        # レコードは追加のたびに連結せず、容量を倍々に確保したバッファの先頭 _size 件として保持する
+        self._records = np.empty(0, dtype=CHUNK_DTYPE)
+        self._size = 0
+        self._text = bytearray()
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def records(self) -> np.ndarray:
+        """チャンクのレコード（バッファのうち使用中の部分のビュー）"""
+        return self._records[:self._size]
+    
+    @records.setter
+    def records(self, records: np.ndarray) -> None:
+        self._records = records
+        self._size = len(records)
+    
+    @staticmethod
+    def _normalize_page_id(page_id: str) -> str:
+        """ページIDのハイフン有無の揺れを吸収"""
+        return page_id.replace("-", "")
+    
+    def _page_number(self, page_id: str, title: str, url: str) -> int:
+        """ページ表の番号を取得（未登録の場合は追加）"""
+        key = self._normalize_page_id(page_id)
+        page_number = self._page_numbers.get(key)
+        if page_number is None:
+            page_number = self._page_numbers[key] = len(self.page_ids)
+            self.page_ids.append(page_id)
+            self.titles.append(title)
+            self.urls.append(url)
+        else:
+            # 同じページが再追加された場合は最新のタイトル・URLに更新
+            self.titles[page_number] = title
+            self.urls[page_number] = url
+        return page_number
+    
+    def extend(self, documents: List[Dict[str, Any]]) -> None:
+        """
+        チャンク（content と metadata を持つ辞書）を追加
+        
+        Args:
+            documents: TextProcessor.split_text 形式のチャンクのリスト
+        """
+        size = self._size + len(documents)
+        if size > len(self._records):
+            records = np.empty(max(size, 2 * len(self._records)), dtype=CHUNK_DTYPE)
+            records[:self._size] = self.records
+            self._records = records
+        
+        for i, doc in enumerate(documents, self._size):
+            metadata = doc.get("metadata", {})
+            encoded, wide = _encode(doc.get("content", ""))
+            self._records[i] = (
+                self._page_number(metadata.get("page_id", ""), metadata.get("title", ""), metadata.get("url", "")),
+                metadata.get("chunk_id", 0),
+                len(self._text),
+                len(encoded),
+                wide,
+            )
+            self._text.extend(encoded)
+        self._size = size
+    
+    def get(self, index: int) -> Dict[str, Any]:
+        """
+        指定位置のチャンクを辞書として取得
+        
+        Returns:
+            {"content": 本文, "metadata": {"page_id", "title", "url", "chunk_id"}}
+        """
+        page, chunk, offset, length, wide = self.records[index].tolist()
+        return {
+            "content": _decode(self._text[offset:offset + length], wide),
+            "metadata": {
+                "page_id": self.page_ids[page],
+                "title": self.titles[page],
+                "url": self.urls[page],
+                "chunk_id": chunk,
+            },
+        }
+    
+    def page_ranges(self, start: int = 0) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        正規化したページIDごとのチャンク位置の範囲 [開始, 終了) を計算
+        
+        同じページのチャンクは連続して追加されるため、ページ番号が変わる位置で区切る
+        
+        Args:
+            start: この位置以降のチャンクだけを対象にする（追加分だけを計算する場合）
+        """
+        page_ranges: Dict[str, List[Tuple[int, int]]] = {}
+        pages = self.records["page"][start:]
+        if len(pages) == 0:
+            return page_ranges
+        
+        boundaries = np.flatnonzero(pages[1:] != pages[:-1]) + 1
+        starts = np.concatenate([[0], boundaries]).tolist()
+        ends = np.concatenate([boundaries, [len(pages)]]).tolist()
+        for range_start, range_end in zip(starts, ends):
+            page_id = self._normalize_page_id(self.page_ids[pages[range_start]])
+            page_ranges.setdefault(page_id, []).append((start + range_start, start + range_end))
+        return page_ranges
+    
+    def title_to_page_ids(self, start: int = 0) -> Dict[str, List[str]]:
+        """タイトル → 正規化したページIDリスト（start以降のチャンクのページのみ）"""
+        title_to_page_ids: Dict[str, List[str]] = {}
+        for page_number in np.unique(self.records["page"][start:]).tolist():
+            page_id = self._normalize_page_id(self.page_ids[page_number])
+            title_to_page_ids.setdefault(self.titles[page_number], []).append(page_id)
+        return title_to_page_ids
+    
+    def mask_pages(self, page_ids: List[str]) -> np.ndarray:
+        """指定ページに属するチャンクをTrueとするマスク"""
+        removed = {self._normalize_page_id(page_id) for page_id in page_ids}
+        page_mask = np.array(
+            [self._normalize_page_id(page_id) in removed for page_id in self.page_ids],
+            dtype=bool,
+        )
+        if len(page_mask) == 0:
+            return np.zeros(len(self.records), dtype=bool)
+        return page_mask[self.records["page"]]
+    
+    def take(self, indices: np.ndarray) -> "ChunkTable":
+        """
+        指定位置のチャンクだけを持つ新しいテーブルを作成（参照されなくなったページ・本文は詰める）
+        
+        Args:
+            indices: 残すチャンクの位置（昇順）
+        """
+        table = ChunkTable()
+        records = self.records[indices]
+        if len(records) == 0:
+            return table
+        
+        # ページ表を詰めて番号を振り直す
+        used_pages, page_numbers = np.unique(records["page"], return_inverse=True)
+        for page_number in used_pages.tolist():
+            table._page_number(self.page_ids[page_number], self.titles[page_number], self.urls[page_number])
+        
+        # 本文バッファを詰めてオフセットを振り直す
+        text = memoryview(self._text)
+        new_records = np.empty(len(records), dtype=CHUNK_DTYPE)
+        new_records["page"] = page_numbers
+        new_records["chunk"] = records["chunk"]
+        new_records["length"] = records["length"]
+        new_records["wide"] = records["wide"]
+        new_records["offset"] = np.concatenate([[0], np.cumsum(records["length"], dtype=np.int64)[:-1]])
+        for offset, length in zip(records["offset"].tolist(), records["length"].tolist()):
+            table._text.extend(text[offset:offset + length])
+        table.records = new_records
+        return table
+    
+    @classmethod
+    def from_documents(cls, documents: List[Dict[str, Any]]) -> "ChunkTable":
+        """チャンクの辞書のリスト（従来の documents.pkl 形式）から作成"""
+        table = cls()
+        table.extend(documents)
+        return table
+    
+    def nbytes(self) -> int:
+        """レコードと本文バッファのバイト数"""
+        return self.records.nbytes + len(self._text)
+    
+    def save(self, path: str) -> None:
+        """
+        指定ディレクトリに chunks.npz（レコード・本文）と pages.json（ページ表）として保存
+        """
+        np.savez(
+            f"{path}/chunks.npz",
+            records=self.records,
+            text=np.frombuffer(bytes(self._text), dtype=np.uint8),
+        )
+        with open(f"{path}/pages.json", "w", encoding="utf-8") as f:
+            json.dump({"page_ids": self.page_ids, "titles": self.titles, "urls": self.urls}, f, ensure_ascii=False)
+    
+    @classmethod
+    def load(cls, path: str) -> "ChunkTable":
+        """save で保存したテーブルを読み込み"""
+        table = cls()
+        with np.load(f"{path}/chunks.npz", allow_pickle=False) as data:
+            table.records = data["records"].astype(CHUNK_DTYPE, copy=False)
+            table._text = bytearray(data["text"].tobytes())
+        with open(f"{path}/pages.json", "r", encoding="utf-8") as f:
+            pages = json.load(f)
+        table.page_ids = pages["page_ids"]
+        table.titles = pages["titles"]
+        table.urls = pages["urls"]
+        table._page_numbers = {
+            table._normalize_page_id(page_id): i for i, page_id in enumerate(table.page_ids)
+        }
+        return table
+    
+    @staticmethod
+    def exists(path: str) -> bool:
+        """指定ディレクトリにテーブルが保存されているか"""
+        return os.path.exists(f"{path}/chunks.npz") and os.path.exists(f"{path}/pages.json")
@@ -1,21 +1,18 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from typing import List
+from typing import List, Dict, Any
 import logging
 
 from app.core.config import get_settings
 
 class TextProcessor:
     def __init__(self):
+        # langchain・sentence-transformers（torch）は読み込みが重いため、使用時に読み込む
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        
         settings = get_settings()
         self.logger = logging.getLogger(__name__)
         
         # テキスト分割器
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.chunk_size,
-            chunk_overlap=settings.chunk_overlap,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
+        self.text_splitter = self.create_text_splitter(settings.chunk_size, settings.chunk_overlap)
         
         # 埋め込みモデル
         try:
@@ -25,6 +22,16 @@ class TextProcessor:
             self.logger.error(f"埋め込みモデルの読み込み中にエラーが発生しました: {str(e)}")
             raise
     
+    @staticmethod
+    def create_text_splitter(chunk_size: int, chunk_overlap: int):
+        """指定したチャンクサイズ・オーバーラップのテキスト分割器を作成"""
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separators=["\n\n", "\n", ". ", " ", ""]
+        )
+    
     def split_text(self, text: str, metadata: dict = None) -> List[dict]:
         """テキストを分割してメタデータを追加"""
         try:
@@ -45,6 +52,15 @@ class TextProcessor:
             self.logger.error(f"テキスト分割中にエラーが発生しました: {str(e)}")
             return []
     
+    def split_page(self, page: Dict[str, Any]) -> List[dict]:
+        """Notionページをメタデータ付きのチャンクに分割"""
+        metadata = {
+            "page_id": page["id"],
+            "title": page["title"],
+            "url": page["url"]
+        }
+        return self.split_text(page["content"], metadata)
+    
     def create_embeddings(self, texts: List[str]) -> List[List[float]]:
         """テキストの埋め込みベクトルを生成"""
         try:
@@ -57,6 +73,14 @@ class TextProcessor:
         """クエリの埋め込みベクトルを生成"""
         try:
             return self.embeddings.embed_query(query)
+        except Exception as e:
+            self.logger.error(f"クエリ埋め込み生成中にエラーが発生しました: {str(e)}")
+            return []
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """複数クエリの埋め込みベクトルをまとめて生成"""
+        try:
+            return self.embeddings.embed_documents(queries)
         except Exception as e:
             self.logger.error(f"クエリ埋め込み生成中にエラーが発生しました: {str(e)}")
             return []
\ No newline at end of file
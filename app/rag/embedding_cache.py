@@ -0,0 +1,90 @@
+import numpy as np
+import sqlite3
+import hashlib
+import os
+import threading
+import logging
+from typing import List, Callable
+
+from app.core.metrics import record_cache
+
+class EmbeddingCache:
+    def __init__(self, path: str, model_name: str):
+        """
+        チャンク本文の埋め込みを保存するローカルキャッシュ
+        
+        本文のハッシュとモデル名をキーに、float32のベクトルをそのまま保持する。
+        チャンク分割の設定を変えて再構築する場合も、同じ本文のチャンクは再計算しない。
+        
+        Args:
+            path: SQLiteファイルのパス
+            model_name: 埋め込みモデル名（モデルごとに別のエントリとして保存する）
+        """
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.model_name = model_name
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (model TEXT, text_hash TEXT, data BLOB, PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.commit()
+    
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def embed(self, texts: List[str], embed_func: Callable[[List[str]], List[List[float]]]) -> np.ndarray:
+        """
+        テキストの埋め込みを取得（キャッシュにないものだけ embed_func で計算して保存）
+        
+        Args:
+            texts: 埋め込むテキストのリスト
+            embed_func: テキストのリストから埋め込みを計算する関数
+        
+        Returns:
+            埋め込みの配列（texts と同じ順序）。計算に失敗した場合は空の配列
+        """
+        hashes = [self._hash(text) for text in texts]
+        cached = {}
+        with self._lock:
+            # SQLiteのプレースホルダ数の上限を超えないよう分割して取得
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, data FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [self.model_name, *batch],
+                ).fetchall()
+                cached.update((text_hash, np.frombuffer(data, dtype=np.float32)) for text_hash, data in rows)
+        
+        missing = list(dict.fromkeys(text_hash for text_hash in hashes if text_hash not in cached))
+        for text_hash in hashes:
+            record_cache("embeddings", text_hash in cached)
+        
+        if missing:
+            texts_by_hash = dict(zip(hashes, texts))
+            embeddings = embed_func([texts_by_hash[text_hash] for text_hash in missing])
+            if len(embeddings) != len(missing):
+                self.logger.error(f"埋め込みの生成に失敗しました: texts={len(missing)}, embeddings={len(embeddings)}")
+                return np.empty((0, 0), dtype=np.float32)
+            
+            embeddings_np = np.asarray(embeddings, dtype=np.float32)
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, data) VALUES (?, ?, ?)",
+                    [(self.model_name, text_hash, embedding.tobytes()) for text_hash, embedding in zip(missing, embeddings_np)],
+                )
+                self._conn.commit()
+            cached.update(zip(missing, embeddings_np))
+        
+        if not hashes:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack([cached[text_hash] for text_hash in hashes])
+    
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
@@ -1,7 +1,9 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 import logging
+import threading
 
 from app.core.config import get_settings
+from app.core.metrics import stage_timer
 from app.rag.embedding import TextProcessor
 from app.rag.vector_store import VectorStore
 
@@ -17,28 +19,31 @@ class RAGOrchestrator:
         if not self.vector_store.load():
             self.logger.warning("ベクトルストアの読み込みに失敗しました。インデックスが構築されていることを確認してください。")
     
+    def is_ready(self) -> bool:
+        """埋め込みモデルとインデックスが読み込まれているか"""
+        return self.vector_store.index is not None
+    
+    def warm_up(self) -> None:
+        """初回リクエストが遅くならないよう、埋め込みと検索を一度実行しておく"""
+        self.text_processor.embed_query("warm up")
+        if self.is_ready():
+            self.search("warm up")
+    
     def retrieve(self, query: str) -> Tuple[List[str], List[str]]:
         """クエリに関連するコンテキストを検索"""
         try:
-            # クエリの埋め込みしてベクトル生成
-            query_embedding = self.text_processor.embed_query(query)
-            
-            # 類似検索
-            docs, _ = self.vector_store.similarity_search(query_embedding, k=self.top_k)
+            hits = self.search(query)
             
             # 結果の整形
             contexts = []
             sources = []
             
-            for doc in docs:
-                content = doc.get("content", "")
-                metadata = doc.get("metadata", {})
-                
-                contexts.append(content)
+            for hit in hits:
+                contexts.append(hit["content"])
                 
                 # ソース情報があれば追加
-                page_title = metadata.get("title", "不明なページ")
-                page_url = metadata.get("url", "")
+                page_title = hit["title"]
+                page_url = hit["url"]
                 if page_url:
                     sources.append(f"{page_title} ({page_url})")
                 else:
@@ -47,4 +52,90 @@ class RAGOrchestrator:
             return contexts, sources
         except Exception as e:
             self.logger.error(f"検索中にエラーが発生しました: {str(e)}")
-            return [], []
\ No newline at end of file
+            return [], []
+    
+    def search(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        page_ids: Optional[List[str]] = None,
+        titles: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """クエリに関連するチャンクをスコア付きで検索（LLM生成なし）"""
+        results = self.search_batch([query], k=k, page_ids=page_ids, titles=titles)
+        return results[0] if results else []
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        k: Optional[int] = None,
+        page_ids: Optional[List[str]] = None,
+        titles: Optional[List[str]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        複数クエリをまとめて埋め込み・検索
+        
+        Args:
+            queries: クエリのリスト
+            k: 各クエリで取得する件数（Noneの場合は設定値のtop_k）
+            page_ids: 検索対象を絞り込むページIDのリスト
+            titles: 検索対象を絞り込むページタイトルのリスト
+            
+        Returns:
+            クエリごとの検索結果リスト（content, score, page_id, title, url, chunk_id）
+        """
+        try:
+            if not queries:
+                return []
+            
+            # クエリをまとめて埋め込みしてベクトル生成
+            with stage_timer("embed_query"):
+                if len(queries) == 1:
+                    query_embeddings = [self.text_processor.embed_query(queries[0])]
+                else:
+                    query_embeddings = self.text_processor.embed_queries(queries)
+            
+            # 検索中に同期で差し替えられても一貫した結果になるよう、参照を一度だけ取得する
+            vector_store = self.vector_store
+            
+            # 類似検索
+            batch_results = vector_store.similarity_search_batch(
+                query_embeddings, k=k if k is not None else self.top_k, page_ids=page_ids, titles=titles
+            )
+            
+            return [
+                [self._format_hit(doc, distance) for doc, distance in zip(docs, distances)]
+                for docs, distances in batch_results
+            ]
+        except Exception as e:
+            self.logger.error(f"検索中にエラーが発生しました: {str(e)}")
+            return []
+    
+    def _format_hit(self, doc: Dict[str, Any], distance: float) -> Dict[str, Any]:
+        """ドキュメントを検索結果の形式に整形"""
+        metadata = doc.get("metadata", {})
+        return {
+            "content": doc.get("content", ""),
+            "score": distance,
+            "page_id": metadata.get("page_id", ""),
+            "title": metadata.get("title", "不明なページ"),
+            "url": metadata.get("url", ""),
+            "chunk_id": metadata.get("chunk_id", 0),
+        }
+
+_orchestrator: Optional[RAGOrchestrator] = None
+_orchestrator_lock = threading.Lock()
+
+def get_rag_orchestrator() -> RAGOrchestrator:
+    """RAGオーケストレーターを1度だけ初期化して使い回す"""
+    global _orchestrator
+    if _orchestrator is None:
+        # 起動時のバックグラウンド読み込みとリクエストが重なっても初期化は1度だけにする
+        with _orchestrator_lock:
+            if _orchestrator is None:
+                _orchestrator = RAGOrchestrator()
+    return _orchestrator
+
+def peek_rag_orchestrator() -> Optional[RAGOrchestrator]:
+    """初期化済みのRAGオーケストレーターを返す（未初期化の場合はNoneを返し、初期化はしない）"""
+    return _orchestrator
\ No newline at end of file
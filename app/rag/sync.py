@@ -0,0 +1,186 @@
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional
+
+from app.core.config import get_settings
+from app.core.notion import NotionAPI
+from app.core.notion_cache import parse_time
+from app.rag.orchestrator import RAGOrchestrator
+from app.rag.vector_store import VectorStore
+
+class IndexSyncer:
+    def __init__(self, orchestrator: RAGOrchestrator, interval: Optional[int] = None):
+        """
+        Notionの変更を定期的に取り込み、検索中のインデックスを差し替える同期デーモン
+        
+        Args:
+            orchestrator: 同期結果を反映するRAGオーケストレーター
+            interval: 同期間隔（秒）。Noneの場合は設定値を使用
+        """
+        settings = get_settings()
+        self.logger = logging.getLogger(__name__)
+        self.orchestrator = orchestrator
+        self.interval = interval or settings.sync_interval
+        self.max_removed_ratio = settings.sync_max_removed_ratio
+        self.full_scan_interval = settings.sync_full_scan_interval
+        self.notion = NotionAPI()
+        # 変更のない同期ではスナップショットを保存しないため、確認した時刻はメモリ上でも進める
+        # （sync_state の値は、_times_version のスナップショットを読み込んだ時点のもの）
+        self._checked_at: Optional[str] = None
+        self._full_scan_at: Optional[str] = None
+        self._times_version: Optional[str] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def _reload_if_stale(self) -> bool:
+        """
+        CURRENTが検索中のスナップショットより新しいものを指している場合（build_index.py などによる保存）は読み込んで差し替える
+        
+        Returns:
+            スナップショットを読み込み直した場合はTrue
+        """
+        current_store = self.orchestrator.vector_store
+        current_version = current_store._read_current_version()
+        if current_version is None or current_version == current_store.snapshot_version:
+            return False
+        
+        new_store = VectorStore()
+        if not new_store.load():
+            self.logger.error(f"スナップショット {current_version} の読み込みに失敗しました。現在のインデックスを引き続き使用します。")
+            return False
+        self.orchestrator.vector_store = new_store
+        self.logger.info(f"新しいスナップショット {new_store.snapshot_version} を検出したため読み込み直しました（ベクトル数: {new_store.get_index_size()}）")
+        return True
+    
+    def _is_full_scan_due(self, now: datetime) -> bool:
+        """前回すべてのページを確認してから sync_full_scan_interval 秒以上経過したか"""
+        full_scan_at = parse_time(self._full_scan_at)
+        return full_scan_at is None or now - full_scan_at >= timedelta(seconds=self.full_scan_interval)
+    
+    def sync_once(self) -> bool:
+        """
+        変更されたページだけを再埋め込みして新しいスナップショットを作成し、検索対象を差し替える
+        
+        通常は検索APIで前回の確認以降に編集されたページだけを調べ、sync_full_scan_interval ごとに
+        すべてのページを確認して、検索に現れない削除や共有の解除を検出する。
+        
+        Returns:
+            インデックスを差し替えた場合はTrue
+        """
+        # 他のプロセスが保存したスナップショットを上書きしないよう、最新のスナップショットから差分を取る
+        reloaded = self._reload_if_stale()
+        current_store = self.orchestrator.vector_store
+        known_pages = current_store.sync_state.get("pages", {})
+        if self._times_version != current_store.snapshot_version:
+            self._checked_at = current_store.sync_state.get("checked_at")
+            self._full_scan_at = current_store.sync_state.get("full_scan_at")
+            self._times_version = current_store.snapshot_version
+        
+        now = datetime.now(timezone.utc)
+        started_at = now.isoformat()
+        full_scan = self._is_full_scan_due(now)
+        
+        # 変更検出に失敗した場合は、ページの削除と誤認しないよう今回の同期を見送る
+        try:
+            changed_pages, page_states = self.notion.get_changed_pages(
+                known_pages, since=None if full_scan else self._checked_at
+            )
+        except Exception as e:
+            self.logger.error(f"Notionの変更検出中にエラーが発生しました。今回の同期をスキップします: {str(e)}")
+            return reloaded
+        
+        removed_page_ids = [page_id for page_id in known_pages if page_id not in page_states]
+        # 同期状態のないインデックス（従来の配置）では、すべてのページを変更扱いにする
+        if not known_pages:
+            removed_page_ids = list(current_store.page_ranges)
+        
+        if not changed_pages and not removed_page_ids:
+            self.logger.info("Notionに変更はありませんでした")
+            self._checked_at = started_at
+            if full_scan:
+                self._full_scan_at = started_at
+            return reloaded
+        
+        # 権限の取り消しなどで大半のページが消えたように見える場合は、空に近いスナップショットを公開しない
+        indexed_page_ids = {page_id.replace("-", "") for page_id in (known_pages or current_store.page_ranges)}
+        lost_page_ids = indexed_page_ids - {page_id.replace("-", "") for page_id in page_states}
+        if indexed_page_ids and (
+            lost_page_ids == indexed_page_ids or len(lost_page_ids) / len(indexed_page_ids) > self.max_removed_ratio
+        ):
+            self.logger.error(
+                f"{len(indexed_page_ids)}ページ中{len(lost_page_ids)}ページが削除されたため、今回の同期を公開しません"
+                f"（許容する割合: {self.max_removed_ratio}）。Notionの共有設定とトークンを確認してください。"
+            )
+            return reloaded
+        
+        self.logger.info(f"Notionの変更を検出しました（更新: {len(changed_pages)}ページ、削除: {len(removed_page_ids)}ページ）")
+        
+        # 変更されたページのチャンク分割と埋め込み
+        documents: List[Dict[str, Any]] = []
+        embeddings: List[List[float]] = []
+        text_processor = self.orchestrator.text_processor
+        for page in changed_pages:
+            if not page["content"]:
+                continue
+            chunks = text_processor.split_page(page)
+            if not chunks:
+                continue
+            page_embeddings = text_processor.create_embeddings([chunk["content"] for chunk in chunks])
+            if len(page_embeddings) != len(chunks):
+                self.logger.error(f"ページ '{page['title']}' の埋め込み生成に失敗しました。今回の同期をスキップします。")
+                return reloaded
+            documents.extend(chunks)
+            embeddings.extend(page_embeddings)
+        
+        # 現在のストアには手を加えず、新しいストアを作成して保存する
+        new_store = current_store.with_updated_pages(
+            removed_page_ids + [page["id"] for page in changed_pages], documents, embeddings
+        )
+        new_store.sync_state = {
+            "pages": page_states,
+            "checked_at": started_at,
+            "full_scan_at": started_at if full_scan else self._full_scan_at,
+        }
+        # 再埋め込みの間に別のスナップショットが保存された場合は、それを読み込んで次回の同期で差分を取り直す
+        if self._reload_if_stale():
+            self.logger.warning("同期中に新しいスナップショットが保存されたため、今回の同期結果は破棄します")
+            return True
+        if not new_store.save():
+            self.logger.error("スナップショットの保存に失敗しました。現在のインデックスを引き続き使用します。")
+            return reloaded
+        
+        # 参照の差し替えのみで切り替える（処理中のリクエストは古いストアを使い続ける）
+        self.orchestrator.vector_store = new_store
+        self.logger.info(f"インデックスをスナップショット {new_store.snapshot_version} に切り替えました（ベクトル数: {new_store.get_index_size()}）")
+        return True
+    
+    def _run(self) -> None:
+        """停止されるまで一定間隔で同期を繰り返す"""
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sync_once()
+            except Exception as e:
+                import traceback
+                error_details = traceback.format_exc()
+                self.logger.error(f"同期中にエラーが発生しました: {str(e)}\n{error_details}")
+    
+    def start(self) -> None:
+        """バックグラウンドで同期を開始"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if self.interval <= 0:
+            self.logger.warning("同期間隔が0以下のため、同期を開始しません")
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="index-syncer", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Notionの差分同期を開始しました（間隔: {self.interval}秒）")
+    
+    def stop(self) -> None:
+        """同期を停止"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.logger.info("Notionの差分同期を停止しました")
@@ -1,11 +1,30 @@
-import faiss
 import numpy as np
 import pickle
+import json
 import os
+import shutil
 import logging
+from datetime import datetime
 from typing import List, Dict, Any, Tuple, Optional
 
 from app.core.config import get_settings
+from app.core.lazy_import import lazy_import
+from app.core.metrics import stage_timer
+from app.rag.chunk_table import ChunkTable
+
+# 起動を速くするため、faissは最初に使われるまで読み込まない
+faiss = lazy_import("faiss")
+
+# インデックスの種類（flat: 全件探索、hnsw: グラフによる近似探索、ivf: クラスタによる近似探索）
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+
+# 次元削減の方式（pca: コーパスで学習したPCA、truncate: 先頭の次元のみを使う（Matryoshka表現学習のモデル向け））
+REDUCTION_METHODS = ("pca", "truncate")
+
+# HNSW・IVFのフィルタ検索で、絞り込み後のベクトル数がこれ以下の場合は対象のベクトルを直接比較する
+FILTER_EXACT_SEARCH_MAX_VECTORS = 4096
+# フィルタ検索でHNSWのefSearchを広げる上限
+FILTER_MAX_EF_SEARCH = 1024
 
 class VectorStore:
     def __init__(self, embedding_size: Optional[int] = None):
@@ -19,8 +38,20 @@ class VectorStore:
         self.logger = logging.getLogger(__name__)
         self.index = None
         self.embedding_size = embedding_size
-        self.documents = []
+        # チャンクのメタデータ（ページ表と配列ベースのレコード）
+        self.chunks = ChunkTable()
         self.vector_store_path = settings.vector_store_path
+        self.snapshot_keep = settings.snapshot_keep
+        self.hnsw_ef_search = settings.hnsw_ef_search
+        self.ivf_nprobe = settings.ivf_nprobe
+        # 読み込み・保存したスナップショットのバージョン
+        self.snapshot_version: Optional[str] = None
+        # Notion差分同期用の状態（ページID → last_edited_time・子ページ）
+        self.sync_state: Dict[str, Any] = {}
+        # ページID → ベクトルIDの範囲リスト（フィルタ検索用）
+        self.page_ranges: Dict[str, List[Tuple[int, int]]] = {}
+        # タイトル → ページIDリスト
+        self.title_to_page_ids: Dict[str, List[str]] = {}
     
     def _initialize_index(self, dimension: int) -> None:
         """
@@ -34,10 +65,345 @@ class VectorStore:
             self.index = faiss.IndexFlatL2(dimension)
             self.logger.info(f"FAISSインデックスを次元数 {dimension} で初期化しました")
     
+    def _inner_index(self, index: Any = None) -> Any:
+        """次元削減の変換を除いた内側のインデックス"""
+        index = self.index if index is None else index
+        if isinstance(index, faiss.IndexPreTransform):
+            return faiss.downcast_index(index.index)
+        return index
+    
+    def get_index_type(self) -> Optional[str]:
+        """インデックスの種類（flat / hnsw / ivf）"""
+        inner = self._inner_index()
+        if inner is None:
+            return None
+        if isinstance(inner, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(inner, faiss.IndexIVF):
+            return "ivf"
+        return "flat"
+    
+    def _create_index(self, dimension: int, index_type: str, vector_count: int) -> Any:
+        """
+        指定した種類の空のインデックスを作成
+        
+        Args:
+            dimension: ベクトルの次元数
+            index_type: インデックスの種類（flat / hnsw / ivf）
+            vector_count: 追加するベクトル数（IVFのクラスタ数の決定に使う）
+        """
+        if index_type == "hnsw":
+            return faiss.IndexHNSWFlat(dimension, 32)
+        if index_type == "ivf":
+            # クラスタ数は 4√n を目安とし、学習に1クラスタあたり39件以上を確保する
+            nlist = max(1, min(int(4 * np.sqrt(vector_count)), vector_count // 39))
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, nlist)
+            # 差分同期でベクトルを復元できるよう、ベクトルIDから格納位置への対応を保持する
+            index.set_direct_map_type(faiss.DirectMap.Array)
+            return index
+        return faiss.IndexFlatL2(dimension)
+    
+    def _configure_index(self, index: Any = None) -> None:
+        """検索時のパラメータを設定値に合わせる"""
+        inner = self._inner_index(index)
+        if isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efSearch = self.hnsw_ef_search
+        elif isinstance(inner, faiss.IndexIVF):
+            inner.nprobe = self.ivf_nprobe
+    
+    def convert_index(self, index_type: str) -> bool:
+        """
+        インデックスを指定した種類に作り直す（次元削減する場合は削減前に変換する）
+        
+        Args:
+            index_type: インデックスの種類（flat / hnsw / ivf）
+            
+        Returns:
+            作り直せた場合はTrue
+        """
+        try:
+            if index_type not in INDEX_TYPES:
+                self.logger.error(f"不明なインデックスの種類です: {index_type}（{' / '.join(INDEX_TYPES)}）")
+                return False
+            
+            if self.index is None:
+                self.logger.error("インデックスが初期化されていないため変換できません")
+                return False
+            
+            if self.get_index_type() == index_type:
+                return True
+            
+            if self.get_reduced_dimension() is not None:
+                self.logger.error("次元削減済みのインデックスは変換できません")
+                return False
+            
+            vectors = self.index.reconstruct_n(0, self.index.ntotal)
+            index = self._create_index(self.embedding_size, index_type, len(vectors))
+            if not index.is_trained:
+                index.train(vectors)
+            index.add(vectors)
+            
+            self.index = index
+            self._configure_index()
+            self.logger.info(f"インデックスを {index_type} に変換しました（{self.index.ntotal}個のベクトル）")
+            return True
+        except Exception as e:
+            import traceback
+            error_details = traceback.format_exc()
+            self.logger.error(f"インデックス変換中にエラーが発生しました: {str(e)}\n{error_details}")
+            return False
+    
+    @staticmethod
+    def _normalize_page_id(page_id: str) -> str:
+        """ページIDのハイフン有無の揺れを吸収"""
+        return page_id.replace("-", "")
+    
+    def _build_page_ranges(self, start: int = 0) -> None:
+        """
+        チャンクの並びからページごとのベクトルID範囲を事前計算
+        
+        同じページのチャンクは連続して追加されるため、ページごとに [開始, 終了) の
+        範囲として保持し、検索時にFAISSのIDSelectorRangeとして利用する
+        
+        Args:
+            start: 追加したチャンクの開始位置（0の場合は全体を計算し直す）
+        """
+        if start == 0:
+            self.page_ranges = self.chunks.page_ranges()
+            self.title_to_page_ids = self.chunks.title_to_page_ids()
+            return
+        
+        # 追加分のチャンクだけを計算して既存の範囲に足す（シャードの結合などで追加を繰り返しても全体を再計算しない）
+        added_ranges = self.chunks.page_ranges(start)
+        if any(page_id in self.page_ranges for page_id in added_ranges):
+            # 既存のページが再追加された場合はタイトルが変わっている可能性があるため、タイトル表は作り直す
+            self.title_to_page_ids = self.chunks.title_to_page_ids()
+        else:
+            for title, page_ids in self.chunks.title_to_page_ids(start).items():
+                self.title_to_page_ids.setdefault(title, []).extend(page_ids)
+        for page_id, ranges in added_ranges.items():
+            page_ranges = self.page_ranges.setdefault(page_id, [])
+            for range_start, range_end in ranges:
+                # 直前の範囲と連続する場合はまとめる（全体を計算した場合と同じ範囲にする）
+                if page_ranges and page_ranges[-1][1] == range_start:
+                    page_ranges[-1] = (page_ranges[-1][0], range_end)
+                else:
+                    page_ranges.append((range_start, range_end))
+    
+    def _selected_ranges(self, page_ids: Optional[List[str]] = None, titles: Optional[List[str]] = None) -> List[Tuple[int, int]]:
+        """
+        ページID・タイトルのフィルタに該当するベクトルIDの範囲を取得
+        
+        Args:
+            page_ids: 対象とするページIDのリスト
+            titles: 対象とするページタイトルのリスト（完全一致）
+            
+        Returns:
+            [開始, 終了) の範囲のリスト（昇順、隣接・重複する範囲はまとめる）
+        """
+        target_page_ids = set()
+        for page_id in page_ids or []:
+            target_page_ids.add(self._normalize_page_id(page_id))
+        for title in titles or []:
+            target_page_ids.update(self.title_to_page_ids.get(title, []))
+        
+        ranges = []
+        for page_id in target_page_ids:
+            ranges.extend(self.page_ranges.get(page_id, []))
+        
+        if not ranges:
+            return []
+        
+        # 隣接・重複する範囲をまとめる
+        ranges_np = np.array(ranges, dtype=np.int64)
+        ranges_np = ranges_np[np.argsort(ranges_np[:, 0], kind="stable")]
+        ends = np.maximum.accumulate(ranges_np[:, 1])
+        is_start = np.concatenate([[True], ranges_np[1:, 0] > ends[:-1]])
+        is_end = np.concatenate([is_start[1:], [True]])
+        return list(zip(ranges_np[is_start, 0].tolist(), ends[is_end].tolist()))
+    
+    def _build_id_selector(self, ranges: List[Tuple[int, int]]) -> Tuple[Any, List[Any]]:
+        """
+        ベクトルIDの範囲からFAISSのIDSelectorを構築
+        
+        Returns:
+            (セレクタ, 参照保持用のオブジェクトリスト)
+        """
+        if len(ranges) == 1:
+            selector = faiss.IDSelectorRange(*ranges[0])
+            return selector, [selector]
+        
+        # 範囲ごとのIDSelectorOrを連結すると判定が範囲数に比例して遅くなるため、
+        # 全ベクトル分のビットマップを1つ作り、IDごとの判定を定数時間にする
+        starts, ends = np.array(ranges, dtype=np.int64).T
+        counts = np.zeros(self.index.ntotal + 1, dtype=np.int32)
+        np.add.at(counts, starts, 1)
+        np.add.at(counts, ends, -1)
+        bitmap = np.packbits(np.cumsum(counts[:-1]) > 0, bitorder="little")
+        selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        # SWIGオブジェクトはビットマップを参照するだけなので、配列も一緒に保持する
+        return selector, [selector, bitmap]
+    
+    def _search_parameters(self, selector: Any, k: int, selected_count: int) -> Any:
+        """
+        IDSelectorを指定した検索パラメータ（次元削減済みのインデックスでは内側のインデックスに渡す）
+        
+        HNSW・IVFでは探索した候補のうち対象外のものが除外されるため、絞り込み後のベクトルの割合に応じて
+        efSearch・nprobeを広げる（検索パラメータの値はインデックスの設定より優先される）
+        
+        Args:
+            selector: IDSelector
+            k: 取得する件数
+            selected_count: 絞り込み後のベクトル数
+        """
+        inner = self._inner_index()
+        scale = self.index.ntotal / max(selected_count, 1)
+        if isinstance(inner, faiss.IndexHNSW):
+            ef_search = max(inner.hnsw.efSearch, k)
+            params = faiss.SearchParametersHNSW(
+                sel=selector, efSearch=int(min(np.ceil(ef_search * scale), max(ef_search, FILTER_MAX_EF_SEARCH)))
+            )
+        elif isinstance(inner, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=int(min(np.ceil(inner.nprobe * scale), inner.nlist)))
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        if isinstance(self.index, faiss.IndexPreTransform):
+            pre_transform_params = faiss.SearchParametersPreTransform()
+            pre_transform_params.index_params = params
+            # 内側のパラメータの参照を保持する
+            pre_transform_params._index_params = params
+            return pre_transform_params
+        return params
+    
+    def _search_ranges(self, query_embeddings: np.ndarray, k: int, ranges: List[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        指定したベクトルIDの範囲だけを全件探索
+        
+        HNSW・IVFの近似探索にIDSelectorを指定すると、絞り込み対象が少ない場合に探索範囲から外れて
+        件数が不足するため、対象が FILTER_EXACT_SEARCH_MAX_VECTORS 件以下の場合は対象のベクトルを復元して直接比較する
+        
+        Returns:
+            (距離, ベクトルID) の配列（FAISSの search と同じ形式）
+        """
+        inner = self._inner_index()
+        vectors = np.vstack([inner.reconstruct_n(start, end - start) for start, end in ranges])
+        ids = np.concatenate([np.arange(start, end, dtype=np.int64) for start, end in ranges])
+        if isinstance(self.index, faiss.IndexPreTransform):
+            for i in range(self.index.chain.size()):
+                query_embeddings = faiss.downcast_VectorTransform(self.index.chain.at(i)).apply(query_embeddings)
+        
+        exact_index = faiss.IndexFlatL2(inner.d)
+        exact_index.add(vectors)
+        distances, positions = exact_index.search(query_embeddings, min(k, len(ids)))
+        return distances, np.where(positions >= 0, ids[positions], -1)
+    
+    def get_reduced_dimension(self) -> Optional[int]:
+        """次元削減済みの場合は削減後の次元数を返す"""
+        if isinstance(self.index, faiss.IndexPreTransform):
+            return self.index.index.d
+        return None
+    
+    def reduce_dimensions(self, method: str, dimension: int, min_recall: float = 0.0, sample_size: int = 1000, k: int = 10) -> Optional[float]:
+        """
+        インデックスのベクトルを次元削減する
+        
+        変換はFAISSのIndexPreTransformとしてインデックスに含めるため、保存・読み込みでそのまま引き継がれ、
+        検索時のクエリ埋め込みにも同じ変換が適用される。インデックスの種類は削減前のものを引き継ぐ。
+        削減前のベクトルの全件探索との再現率を計測し、min_recall を下回る場合は削減前のインデックスをそのまま使う。
+        
+        Args:
+            method: 次元削減の方式（pca / truncate）
+            dimension: 削減後の次元数
+            min_recall: 次元削減を採用する最低の再現率
+            sample_size: 再現率の計測に使うベクトル数（インデックス内のベクトルをクエリとし、クエリ自身は結果から除く）
+            k: 再現率を計測する検索件数
+            
+        Returns:
+            削減前のベクトルの全件探索の上位k件に対する再現率（次元削減できなかった場合はNone）
+        """
+        try:
+            if method not in REDUCTION_METHODS:
+                self.logger.error(f"不明な次元削減の方式です: {method}（{' / '.join(REDUCTION_METHODS)}）")
+                return None
+            
+            if self.index is None or self.index.ntotal == 0:
+                self.logger.error("インデックスが空のため次元削減できません")
+                return None
+            
+            if self.get_reduced_dimension() is not None:
+                self.logger.error("インデックスは既に次元削減されています")
+                return None
+            
+            if not 0 < dimension < self.embedding_size:
+                self.logger.error(f"削減後の次元数は1以上 {self.embedding_size} 未満で指定してください: {dimension}")
+                return None
+            
+            vectors = self.index.reconstruct_n(0, self.index.ntotal)
+            
+            if method == "pca":
+                if len(vectors) < dimension:
+                    self.logger.error(f"PCAの学習には削減後の次元数以上のベクトルが必要です: ベクトル数={len(vectors)}, 次元数={dimension}")
+                    return None
+                transform = faiss.PCAMatrix(self.embedding_size, dimension)
+                transform.train(vectors)
+            else:
+                # 先頭の dimension 次元を取り出す線形変換
+                transform = faiss.LinearTransform(self.embedding_size, dimension, False)
+                faiss.copy_array_to_vector(np.eye(dimension, self.embedding_size, dtype=np.float32).ravel(), transform.A)
+                transform.is_trained = True
+            
+            reduced_index = faiss.IndexPreTransform(
+                transform, self._create_index(dimension, self.get_index_type(), len(vectors))
+            )
+            if not reduced_index.is_trained:
+                reduced_index.train(vectors)
+            reduced_index.add(vectors)
+            
+            # 削減前のベクトルの全件探索の結果を正解として再現率を計測
+            rng = np.random.default_rng(0)
+            sample_ids = rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False)
+            search_k = min(k, len(vectors) - 1)
+            
+            def neighbors(index: Any) -> List[List[int]]:
+                # クエリ自身はどのインデックスでも最上位に来やすく再現率を水増しするため、結果から除く
+                _, ids = index.search(vectors[sample_ids], search_k + 1)
+                return [
+                    [i for i in row if i >= 0 and i != query_id][:search_k]
+                    for query_id, row in zip(sample_ids.tolist(), ids.tolist())
+                ]
+            
+            exact_index = faiss.IndexFlatL2(self.embedding_size)
+            exact_index.add(vectors)
+            expected = neighbors(exact_index)
+            self._configure_index(reduced_index)
+            
+            def measure_recall(index: Any) -> float:
+                return float(np.mean([
+                    len(set(expected_row) & set(actual_row)) / len(expected_row) if expected_row else 1.0
+                    for expected_row, actual_row in zip(expected, neighbors(index))
+                ]))
+            
+            recall = measure_recall(reduced_index)
+            # HNSW・IVFでは近似探索自体の取りこぼしも含まれるため、削減前のインデックスの再現率も併記する
+            full_recall = measure_recall(self.index)
+            
+            if recall < min_recall:
+                self.logger.warning(f"次元削減後の再現率@{search_k}が {recall:.3f}（削減前: {full_recall:.3f}）で、最低値 {min_recall:.3f} を下回るため、削減前のインデックスを使います")
+                return recall
+            
+            self.index = reduced_index
+            self.logger.info(f"インデックスを {method} で {self.embedding_size} 次元から {dimension} 次元に削減しました（再現率@{search_k}: {recall:.3f}、削減前: {full_recall:.3f}）")
+            return recall
+        except Exception as e:
+            import traceback
+            error_details = traceback.format_exc()
+            self.logger.error(f"次元削減中にエラーが発生しました: {str(e)}\n{error_details}")
+            return None
+    
     def add_documents(self, documents: List[Dict[str, Any]], embeddings: List[List[float]]) -> None:
         """ドキュメントとその埋め込みをベクトルストアに追加"""
         try:
-            if not documents or not embeddings:
+            if not documents or len(embeddings) == 0:
                 self.logger.warning("追加するドキュメントまたは埋め込みが空です")
                 return
             
@@ -65,8 +431,10 @@ class VectorStore:
                 # FAISSインデックスにベクトルを追加
                 self.index.add(embeddings_np)
                 
-                # 元のドキュメントを保存
-                self.documents.extend(documents)
+                # チャンクのメタデータをページ表とレコードに変換して保存
+                start = len(self.chunks)
+                self.chunks.extend(documents)
+                self._build_page_ranges(start)
                 self.logger.info(f"{len(documents)}個のドキュメントをベクトルストアに追加しました")
             else:
                 self.logger.warning("追加する埋め込みが空です")
@@ -75,76 +443,222 @@ class VectorStore:
             error_details = traceback.format_exc()
             self.logger.error(f"ドキュメント追加中にエラーが発生しました: {str(e)}\n{error_details}")
     
-    def similarity_search(self, query_embedding: List[float], k: int = 5) -> Tuple[List[Dict[str, Any]], List[float]]:
+    def similarity_search(
+        self,
+        query_embedding: List[float],
+        k: int = 5,
+        page_ids: Optional[List[str]] = None,
+        titles: Optional[List[str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], List[float]]:
         """クエリ埋め込みに最も近いドキュメントを検索"""
+        results = self.similarity_search_batch([query_embedding], k=k, page_ids=page_ids, titles=titles)
+        if not results:
+            return [], []
+        return results[0]
+    
+    def similarity_search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        k: int = 5,
+        page_ids: Optional[List[str]] = None,
+        titles: Optional[List[str]] = None,
+    ) -> List[Tuple[List[Dict[str, Any]], List[float]]]:
+        """
+        複数のクエリ埋め込みをまとめて検索
+        
+        Args:
+            query_embeddings: クエリ埋め込みのリスト
+            k: 各クエリで取得する件数
+            page_ids: 検索対象を絞り込むページIDのリスト
+            titles: 検索対象を絞り込むページタイトルのリスト
+            
+        Returns:
+            クエリごとの (ドキュメントリスト, 距離リスト) のリスト
+        """
         try:
             # インデックスが初期化されていない場合はエラー
             if self.index is None:
                 self.logger.error("インデックスが初期化されていません")
-                return [], []
+                return []
             
             # ドキュメントが空の場合は空の結果を返す
-            if not self.documents:
+            if len(self.chunks) == 0:
                 self.logger.warning("ドキュメントが存在しないため検索できません")
-                return [], []
+                return []
             
-            query_embedding_np = np.array([query_embedding], dtype=np.float32)
+            # NumPy配列でも受け付けるため、真偽値ではなく件数で判定する
+            if len(query_embeddings) == 0:
+                return []
+            
+            query_embeddings_np = np.array(query_embeddings, dtype=np.float32)
             
             # クエリ埋め込みの次元数がインデックスと一致するか確認
-            if query_embedding_np.shape[1] != self.embedding_size:
-                self.logger.error(f"クエリ埋め込みの次元数がインデックスと一致しません: クエリ={query_embedding_np.shape[1]}, インデックス={self.embedding_size}")
-                return [], []
+            if query_embeddings_np.ndim != 2 or query_embeddings_np.shape[1] != self.embedding_size:
+                self.logger.error(f"クエリ埋め込みの次元数がインデックスと一致しません: クエリ={query_embeddings_np.shape}, インデックス={self.embedding_size}")
+                return []
             
             # インデックスが空の場合は空の結果を返す
             if self.index.ntotal == 0:
                 self.logger.warning("インデックスが空のため検索できません")
-                return [], []
+                return []
             
-            # 検索実行
-            distances, indices = self.index.search(query_embedding_np, min(k, self.index.ntotal))
+            # フィルタ指定がある場合はFAISS内部でID範囲に絞り込む（近似探索で対象が少ない場合は直接比較する）
+            params = None
+            exact_ranges = None
+            if page_ids or titles:
+                ranges = self._selected_ranges(page_ids, titles)
+                if not ranges:
+                    self.logger.info("フィルタ条件に一致するページがありません")
+                    return [([], []) for _ in query_embeddings]
+                selected_count = sum(end - start for start, end in ranges)
+                if self.get_index_type() != "flat" and selected_count <= FILTER_EXACT_SEARCH_MAX_VECTORS:
+                    exact_ranges = ranges
+                else:
+                    selector, _selectors = self._build_id_selector(ranges)
+                    params = self._search_parameters(selector, k, selected_count)
             
-            results = []
-            for i, idx in enumerate(indices[0]):
-                # FAISSは検索時に類似のものがない場合、-1を返すことがあるため、インデックスが有効かチェック
-                if idx >= 0 and idx < len(self.documents):
-                    results.append((self.documents[idx], float(distances[0][i])))
-            
-            # 距離でソート（最も近いものが先頭）
-            results.sort(key=lambda x: x[1])
+            # 検索実行
+            with stage_timer("faiss_search"):
+                if exact_ranges is not None:
+                    distances, indices = self._search_ranges(query_embeddings_np, k, exact_ranges)
+                else:
+                    distances, indices = self.index.search(query_embeddings_np, min(k, self.index.ntotal), params=params)
             
-            # ドキュメントと距離を分離
-            docs = [doc for doc, _ in results]
-            distances = [dist for _, dist in results]
+            batch_results = []
+            with stage_timer("document_lookup"):
+                for row_distances, row_indices in zip(distances, indices):
+                    results = []
+                    for dist, idx in zip(row_distances, row_indices):
+                        # FAISSは検索時に類似のものがない場合、-1を返すことがあるため、インデックスが有効かチェック
+                        if idx >= 0 and idx < len(self.chunks):
+                            # 辞書は上位k件に対してのみ生成する
+                            results.append((self.chunks.get(idx), float(dist)))
+                    
+                    # 距離でソート（最も近いものが先頭）
+                    results.sort(key=lambda x: x[1])
+                    
+                    # ドキュメントと距離を分離
+                    batch_results.append(([doc for doc, _ in results], [dist for _, dist in results]))
             
-            return docs, distances
+            return batch_results
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
             self.logger.error(f"検索中にエラーが発生しました: {str(e)}\n{error_details}")
-            return [], []
+            return []
+    
+    def with_updated_pages(self, page_ids: List[str], documents: List[Dict[str, Any]], embeddings: List[List[float]]) -> "VectorStore":
+        """
+        指定ページのチャンクを差し替えた新しいベクトルストアを作成
+        
+        既存のストアは変更しないため、検索中のリクエストは古いストアをそのまま使い続けられる。
+        変更のないページのベクトルはインデックスを複製して再利用する（次元削減の変換も引き継がれる）。
+        
+        Args:
+            page_ids: 削除・差し替えるページIDのリスト
+            documents: 追加するドキュメント
+            embeddings: 追加するドキュメントの埋め込み
+            
+        Returns:
+            新しいベクトルストア
+        """
+        new_store = VectorStore(embedding_size=self.embedding_size)
+        new_store.vector_store_path = self.vector_store_path
+        new_store.sync_state = dict(self.sync_state)
+        
+        if self.index is not None:
+            removed_mask = self.chunks.mask_pages(page_ids)
+            new_store.index = self._copy_index_without(removed_mask)
+            new_store._configure_index()
+            new_store.chunks = self.chunks.take(np.flatnonzero(~removed_mask))
+            new_store._build_page_ranges()
+        
+        if documents:
+            new_store.add_documents(documents, embeddings)
+        
+        return new_store
+    
+    def _copy_index_without(self, removed_mask: np.ndarray) -> Any:
+        """
+        指定したベクトルを除いたインデックスの複製を作成（ベクトルIDは詰めて振り直し、チャンクの並びと一致させる）
+        
+        Args:
+            removed_mask: 除くベクトルをTrueとするマスク
+        """
+        index = faiss.clone_index(self.index)
+        inner = self._inner_index(index)
+        if isinstance(inner, faiss.IndexFlat):
+            index.remove_ids(np.flatnonzero(removed_mask).astype(np.int64))
+            return index
+        
+        # HNSWは削除に対応せず、IVFは削除してもIDが詰められないため、学習済みの状態を残して入れ直す
+        # （HNSWではグラフを全件から作り直すため、1ページの更新でもコストはベクトル数に比例する。既知のコスト）
+        vectors = self._inner_index().reconstruct_n(0, self.index.ntotal)[~removed_mask]
+        index.reset()
+        inner.add(vectors)
+        # 変換済みのベクトルを内側のインデックスに直接追加したため、外側のベクトル数を合わせる
+        index.ntotal = inner.ntotal
+        return index
+    
+    def _snapshots_path(self) -> str:
+        return f"{self.vector_store_path}/snapshots"
+    
+    def _read_current_version(self) -> Optional[str]:
+        """CURRENTポインタから現在のスナップショットバージョンを取得"""
+        current_path = f"{self.vector_store_path}/CURRENT"
+        if not os.path.exists(current_path):
+            return None
+        with open(current_path, "r", encoding="utf-8") as f:
+            version = f.read().strip()
+        return version or None
     
     def save(self) -> bool:
-        """ベクトルストアを保存"""
+        """
+        ベクトルストアをスナップショットとして保存
+        
+        バージョンごとのディレクトリに書き込んでから CURRENT ポインタをアトミックに差し替えるため、
+        読み込み側が新旧のファイルを混在して読み込むことはない。
+        """
         try:
             # インデックスが初期化されていない場合はエラー
             if self.index is None:
                 self.logger.error("インデックスが初期化されていないため保存できません")
                 return False
             
-            if not self.documents or self.index.ntotal == 0:
+            if len(self.chunks) == 0 or self.index.ntotal == 0:
                 self.logger.warning("保存するドキュメントまたはインデックスが空です")
                 # 空でも保存を試みる
             
-            os.makedirs(self.vector_store_path, exist_ok=True)
+            snapshots_path = self._snapshots_path()
+            os.makedirs(snapshots_path, exist_ok=True)
             
-            # ドキュメントを保存
-            with open(f"{self.vector_store_path}/documents.pkl", "wb") as f:
-                pickle.dump(self.documents, f)
+            version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+            tmp_path = f"{snapshots_path}/.tmp-{version}"
+            os.makedirs(tmp_path)
+            
+            # チャンクのメタデータを保存
+            self.chunks.save(tmp_path)
             
             # FAISSインデックスを保存
-            faiss.write_index(self.index, f"{self.vector_store_path}/index.faiss")
+            faiss.write_index(self.index, f"{tmp_path}/index.faiss")
+            
+            # 差分同期用の状態を保存
+            with open(f"{tmp_path}/sync_state.json", "w", encoding="utf-8") as f:
+                json.dump(self.sync_state, f, ensure_ascii=False)
+            
+            # 書き込み完了後にディレクトリを確定し、ポインタを差し替える
+            os.rename(tmp_path, f"{snapshots_path}/{version}")
+            current_tmp_path = f"{self.vector_store_path}/CURRENT.tmp"
+            with open(current_tmp_path, "w", encoding="utf-8") as f:
+                f.write(version)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(current_tmp_path, f"{self.vector_store_path}/CURRENT")
+            self.snapshot_version = version
+            
+            self._prune_snapshots()
             
-            self.logger.info(f"ベクトルストアを {self.vector_store_path} に保存しました（ドキュメント数: {len(self.documents)}、ベクトル数: {self.index.ntotal}）")
+            self.logger.info(f"ベクトルストアを {snapshots_path}/{version} に保存しました（ドキュメント数: {len(self.chunks)}、ベクトル数: {self.index.ntotal}）")
             return True
         except Exception as e:
             import traceback
@@ -152,15 +666,34 @@ class VectorStore:
             self.logger.error(f"ベクトルストア保存中にエラーが発生しました: {str(e)}\n{error_details}")
             return False
     
+    def _prune_snapshots(self) -> None:
+        """古いスナップショットを削除（直近 snapshot_keep 個と現在のものは残す）"""
+        snapshots_path = self._snapshots_path()
+        versions = sorted(name for name in os.listdir(snapshots_path) if not name.startswith("."))
+        current_version = self._read_current_version()
+        for version in versions[:-self.snapshot_keep] if self.snapshot_keep > 0 else []:
+            if version == current_version:
+                continue
+            shutil.rmtree(f"{snapshots_path}/{version}", ignore_errors=True)
+            self.logger.info(f"古いスナップショットを削除しました: {version}")
+    
     def load(self) -> bool:
         """ベクトルストアを読み込み"""
         try:
-            documents_path = f"{self.vector_store_path}/documents.pkl"
-            index_path = f"{self.vector_store_path}/index.faiss"
+            # スナップショットがあればCURRENTの指すバージョンを、なければ従来の配置を読み込む
+            version = self._read_current_version()
+            if version:
+                load_path = f"{self._snapshots_path()}/{version}"
+            else:
+                load_path = self.vector_store_path
+            
+            legacy_documents_path = f"{load_path}/documents.pkl"
+            index_path = f"{load_path}/index.faiss"
+            sync_state_path = f"{load_path}/sync_state.json"
             
             # ファイルが存在するか確認
-            if not os.path.exists(documents_path):
-                self.logger.error(f"ドキュメントファイルが見つかりません: {documents_path}")
+            if not ChunkTable.exists(load_path) and not os.path.exists(legacy_documents_path):
+                self.logger.error(f"ドキュメントファイルが見つかりません: {load_path}/chunks.npz")
                 return False
                 
             if not os.path.exists(index_path):
@@ -169,23 +702,36 @@ class VectorStore:
             
             # ドキュメントを読み込み
             try:
-                with open(documents_path, "rb") as f:
-                    self.documents = pickle.load(f)
-                self.logger.info(f"ドキュメントファイルを読み込みました: {len(self.documents)}個のドキュメント")
+                if ChunkTable.exists(load_path):
+                    self.chunks = ChunkTable.load(load_path)
+                else:
+                    # 従来の形式（チャンクごとの辞書のリスト）はテーブルに変換して保持する
+                    with open(legacy_documents_path, "rb") as f:
+                        self.chunks = ChunkTable.from_documents(pickle.load(f))
+                self.logger.info(f"ドキュメントファイルを読み込みました: {len(self.chunks)}個のドキュメント")
             except Exception as e:
                 self.logger.error(f"ドキュメントファイル読み込み中にエラーが発生しました: {str(e)}")
                 return False
+            self._build_page_ranges()
             
             # FAISSインデックスを読み込み
             try:
                 self.index = faiss.read_index(index_path)
                 self.embedding_size = self.index.d  # インデックスから次元数を取得
+                self._configure_index()
                 self.logger.info(f"FAISSインデックスを読み込みました: {self.index.ntotal}個のベクトル、次元数: {self.embedding_size}")
             except Exception as e:
                 self.logger.error(f"FAISSインデックス読み込み中にエラーが発生しました: {str(e)}")
                 return False
             
-            self.logger.info(f"ベクトルストアを {self.vector_store_path} から読み込みました（{len(self.documents)}個のドキュメント）")
+            # 差分同期用の状態を読み込み（従来の配置にはないため任意）
+            self.sync_state = {}
+            if os.path.exists(sync_state_path):
+                with open(sync_state_path, "r", encoding="utf-8") as f:
+                    self.sync_state = json.load(f)
+            
+            self.snapshot_version = version
+            self.logger.info(f"ベクトルストアを {load_path} から読み込みました（{len(self.chunks)}個のドキュメント）")
             return True
         except Exception as e:
             import traceback
@@ -204,5 +750,10 @@ class VectorStore:
         return {
             "vector_count": self.get_index_size(),
             "dimension": self.embedding_size if self.embedding_size is not None else "未初期化",
-            "documents_count": len(self.documents)
+            "reduced_dimension": self.get_reduced_dimension(),
+            "index_type": self.get_index_type(),
+            "documents_count": len(self.chunks),
+            "chunk_metadata_bytes": self.chunks.nbytes(),
+            "pages_count": len(self.page_ranges),
+            "snapshot_version": self.snapshot_version
         }
\ No newline at end of file
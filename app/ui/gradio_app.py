@@ -5,18 +5,19 @@ import traceback
 import re
 from typing import List, Tuple
 
-from app.rag.orchestrator import RAGOrchestrator
+from app.core.request_context import LOG_FORMAT, bind_request_id
+from app.rag.orchestrator import get_rag_orchestrator
 from app.llm.ollama import OllamaClient
 
 # ロガーの設定
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
 def create_gradio_app():
     """Gradioチャットアプリを作成"""
     
     # RAGとLLMコンポーネントの初期化
-    rag = RAGOrchestrator()
+    rag = get_rag_orchestrator()
     llm = OllamaClient()
     
     def clean_response(text: str) -> str:
@@ -39,6 +40,8 @@ def create_gradio_app():
     def respond(message: str, history: List[Tuple[str, str]]):
         """チャットボットの応答関数"""
         try:
+            # Gradioのキュー経由ではHTTPリクエストのコンテキストが引き継がれないため、応答ごとに採番する
+            bind_request_id()
             logger.info(f"ユーザーメッセージを受信: {message}")
             
             # 関連コンテキストを取得
@@ -0,0 +1,279 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from threading import Thread
+from typing import List, Dict, Any, Callable, Optional
+
+# プロジェクトルートをPythonパスに追加
+project_root = str(Path(__file__).parent.parent.absolute())
+sys.path.insert(0, project_root)
+
+import numpy as np
+import requests
+
+from fake_ollama import FakeOllamaServer
+
+# ロギングの設定
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, Any]:
+    """レイテンシ（秒）のリストから統計値を計算"""
+    if not latencies:
+        return {"count": 0}
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "count": len(latencies),
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "max_ms": float(latencies_ms.max()),
+        "throughput_per_s": len(latencies) / elapsed if elapsed > 0 else None,
+    }
+
+def measure(func: Callable[[Any], Any], inputs: List[Any], warmup: int = 3) -> Dict[str, Any]:
+    """入力ごとに関数を実行してレイテンシを計測"""
+    for value in inputs[:warmup]:
+        func(value)
+    latencies = []
+    start = time.perf_counter()
+    for value in inputs:
+        call_start = time.perf_counter()
+        func(value)
+        latencies.append(time.perf_counter() - call_start)
+    return summarize(latencies, time.perf_counter() - start)
+
+def peak_rss_mb() -> float:
+    """プロセスの最大常駐メモリ（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def make_queries(count: int, seed: int) -> List[str]:
+    """合成コーパスの語彙からクエリを生成"""
+    from app.core.synthetic_workspace import VOCABULARY
+    rng = random.Random(seed)
+    return [f"{rng.choice(VOCABULARY)}の{rng.choice(VOCABULARY)}について教えてください" for _ in range(count)]
+
+def prepare_environment(args: argparse.Namespace, work_dir: str, ollama_api_base: str) -> str:
+    """合成ワークスペースを生成し、リプレイモードで構築・検索するよう環境変数を設定"""
+    from app.core.config import get_settings
+    from app.core.notion_cache import NotionResponseStore
+    from app.core.synthetic_workspace import generate_workspace
+    
+    cache_path = f"{work_dir}/notion_cache.sqlite3"
+    store = NotionResponseStore(cache_path)
+    root_id = generate_workspace(
+        store,
+        page_count=args.pages,
+        max_depth=args.depth,
+        blocks_per_page=args.blocks_per_page,
+        seed=args.seed,
+    )
+    store.close()
+    
+    os.environ.setdefault("NOTION_TOKEN", "benchmark")
+    os.environ.update({
+        "NOTION_PAGE_ID": root_id,
+        "NOTION_CACHE_MODE": "replay",
+        "NOTION_CACHE_PATH": cache_path,
+        "VECTOR_STORE_PATH": f"{work_dir}/index",
+        "OLLAMA_API_BASE": ollama_api_base,
+        "SYNC_INTERVAL": "0",
+    })
+    get_settings.cache_clear()
+    return root_id
+
+def measure_cold_start(code: str) -> Dict[str, Any]:
+    """新しいプロセスでコードを実行し、終了までの時間を計測"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=project_root, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        return {"seconds": None, "error": result.stderr.strip().splitlines()[-1:]}
+    return {"seconds": elapsed}
+
+def measure_server_startup(timeout: float = 300) -> Dict[str, Any]:
+    """サーバーを別プロセスで起動し、/healthz と /readyz が応答するまでの時間を計測"""
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=project_root,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    result: Dict[str, Any] = {"healthz_s": None, "readyz_s": None}
+    try:
+        while time.perf_counter() - start < timeout and process.poll() is None:
+            for probe in ("healthz", "readyz"):
+                if result[f"{probe}_s"] is not None:
+                    continue
+                try:
+                    response = requests.get(f"http://127.0.0.1:{port}/{probe}", timeout=1)
+                except requests.RequestException:
+                    break
+                if response.status_code == 200:
+                    result[f"{probe}_s"] = time.perf_counter() - start
+                elif response.json().get("status") in ("error", "no_index"):
+                    result["error"] = response.json().get("detail")
+            if result["readyz_s"] is not None or "error" in result:
+                break
+            time.sleep(0.05)
+        if process.poll() is not None:
+            result["error"] = f"サーバーが終了しました（終了コード: {process.returncode}）"
+    finally:
+        process.terminate()
+        process.wait()
+    return result
+
+def benchmark_chat(queries: List[str], requests_count: int, concurrency: int) -> Dict[str, Any]:
+    """/api/chat をHTTP経由で負荷試験"""
+    import uvicorn
+    from fastapi import FastAPI
+    from app.api.endpoints import router
+    
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    
+    url = f"http://127.0.0.1:{port}/api/chat"
+    
+    def send(query: str) -> Optional[float]:
+        start = time.perf_counter()
+        response = requests.post(url, json={"query": query}, timeout=300)
+        return time.perf_counter() - start if response.status_code == 200 else None
+    
+    try:
+        # ウォームアップ
+        send(queries[0])
+        targets = [queries[i % len(queries)] for i in range(requests_count)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(send, targets))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.should_exit = True
+        thread.join()
+    
+    latencies = [latency for latency in results if latency is not None]
+    return dict(summarize(latencies, elapsed), errors=len(results) - len(latencies), concurrency=concurrency)
+
+def run_benchmark(args: argparse.Namespace, work_dir: str) -> Dict[str, Any]:
+    """ベンチマーク一式を実行して結果を返す"""
+    fake_ollama = FakeOllamaServer(
+        tokens=args.tokens,
+        token_latency=args.token_latency,
+        first_token_latency=args.first_token_latency,
+    )
+    fake_ollama.start()
+    
+    try:
+        prepare_environment(args, work_dir, fake_ollama.api_base)
+        
+        from build_index import build_index
+        from app.rag.orchestrator import get_rag_orchestrator
+        
+        # インデックス構築
+        start = time.perf_counter()
+        build_index()
+        build_seconds = time.perf_counter() - start
+        
+        # 起動時間
+        start = time.perf_counter()
+        rag = get_rag_orchestrator()
+        orchestrator_init_seconds = time.perf_counter() - start
+        startup = {
+            "orchestrator_init_s": orchestrator_init_seconds,
+            "orchestrator_cold_start": measure_cold_start(
+                "from app.rag.orchestrator import RAGOrchestrator; RAGOrchestrator()"
+            ),
+            "app_import": measure_cold_start("import app.main"),
+            "server": measure_server_startup(),
+        }
+        
+        # 検索のマイクロベンチマーク
+        queries = make_queries(args.queries, args.seed)
+        embeddings = [rag.text_processor.embed_query(query) for query in queries]
+        vector_store = rag.vector_store
+        retrieval = {
+            "embed_query": measure(rag.text_processor.embed_query, queries),
+            "similarity_search": measure(lambda embedding: vector_store.similarity_search(embedding, k=rag.top_k), embeddings),
+            "retrieve": measure(rag.retrieve, queries),
+        }
+        
+        # /api/chat の負荷試験
+        chat = benchmark_chat(queries, args.requests, args.concurrency)
+        
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "config": vars(args),
+            "index": dict(vector_store.get_index_info(), build_s=build_seconds),
+            "startup": startup,
+            "retrieval": retrieval,
+            "chat": chat,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    finally:
+        fake_ollama.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="合成コーパスとスタブOllamaを使ったエンドツーエンドのベンチマーク")
+    parser.add_argument("--pages", type=int, default=200, help="合成ワークスペースのページ数")
+    parser.add_argument("--depth", type=int, default=3, help="ページ階層の最大の深さ")
+    parser.add_argument("--blocks-per-page", type=int, default=20, help="1ページあたりのブロック数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--queries", type=int, default=100, help="検索ベンチマークのクエリ数")
+    parser.add_argument("--requests", type=int, default=50, help="/api/chat へのリクエスト数")
+    parser.add_argument("--concurrency", type=int, default=4, help="/api/chat への同時リクエスト数")
+    parser.add_argument("--tokens", type=int, default=50, help="スタブOllamaが生成するトークン数")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="スタブOllamaの1トークンあたりの生成時間（秒）")
+    parser.add_argument("--first-token-latency", type=float, default=0.05, help="スタブOllamaの最初のトークンまでの時間（秒）")
+    parser.add_argument("--work-dir", type=str, default=None, help="作業ディレクトリ（デフォルトは一時ディレクトリ）")
+    parser.add_argument("--output", type=str, default=None, help="結果のJSONを書き出すパス")
+    args = parser.parse_args()
+    
+    if args.work_dir:
+        os.makedirs(args.work_dir, exist_ok=True)
+        results = run_benchmark(args, args.work_dir)
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            results = run_benchmark(args, work_dir)
+    
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        logger.info(f"ベンチマーク結果を {args.output} に書き出しました")
+    print(output)
@@ -2,7 +2,9 @@ import argparse
 import logging
 import os
 import sys
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
 
 # プロジェクトルートをPythonパスに追加
 project_root = str(Path(__file__).parent.parent.absolute())
@@ -12,6 +14,7 @@ from tqdm import tqdm
 
 from app.core.config import get_settings
 from app.core.notion import NotionAPI
+from app.rag.checkpoint import BuildCheckpoint
 from app.rag.embedding import TextProcessor
 from app.rag.vector_store import VectorStore
 
@@ -22,8 +25,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def build_index():
-    """Notionページからインデックスを構築"""
+def build_index(
+    resume: bool = False,
+    flush_interval: int = 50,
+    index_type: Optional[str] = None,
+    reduction: Optional[str] = None,
+    reduction_dim: int = 128,
+    min_recall: float = 0.0,
+):
+    """
+    Notionページからインデックスを構築
+    
+    ページの取得・埋め込みは flush_interval ページごとにシャードとして書き出し、
+    探索状態と合わせてチェックポイントを保存する。最後にシャードをまとめてインデックス化する。
+    
+    Args:
+        resume: 前回中断したチェックポイントから再開する
+        flush_interval: チェックポイントを保存するページ間隔
+        index_type: FAISSインデックスの種類（flat / hnsw / ivf。Noneの場合は設定値）
+        reduction: 埋め込みの次元削減の方式（pca / truncate。Noneの場合は削減しない）
+        reduction_dim: 次元削減後の次元数
+        min_recall: 次元削減を採用する最低の再現率（削減前のインデックスとの比較）
+    """
     settings = get_settings()
     
     # Notionクライアント
@@ -32,69 +55,164 @@ def build_index():
     # テキスト処理
     text_processor = TextProcessor()
     
-    # ベクトルストア
-    vector_store = VectorStore()
+    # チェックポイント
+    checkpoint = BuildCheckpoint()
+    
+    state = checkpoint.load_state() if resume else None
+    if state:
+        logger.info(f"チェックポイントから再開します（処理済み: {len(state['visited'])}ページ、シャード数: {state['shard_count']}）")
+        # 前回の中断時に構築状態の保存より後に追記されたページ状態は、再取得するため捨てる
+        checkpoint.truncate_page_states(state["page_states_bytes"])
+    else:
+        if resume:
+            logger.warning("再開できるチェックポイントがないため、最初から構築します。")
+        elif checkpoint.exists():
+            logger.warning("既存のチェックポイントを破棄して最初から構築します。再開する場合は --resume オプションを使用してください。")
+        checkpoint.clear()
+        
+        if not settings.notion_page_id:
+            logger.error("親ページIDが設定されていません")
+            return
+        
+        state = {
+            # 差分同期はこの時刻以降の編集を検索APIで検出する
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "stack": [settings.notion_page_id],
+            "visited": [],
+            "shard_count": 0,
+            "total_chunks": 0,
+            "page_count": 0,
+            # 追記したページ状態のうち確定しているバイト数
+            "page_states_bytes": 0,
+        }
+    
+    stack = state["stack"]
+    visited = set(state["visited"])
+    
+    # 次のチェックポイントまでのチャンクと埋め込み
+    buffered_chunks = []
+    buffered_embeddings = []
+    # 次のチェックポイントまでに処理したページの差分同期用の状態
+    buffered_page_states = {}
+    
+    def flush():
+        """バッファをシャードとして書き出し、チェックポイントを保存"""
+        nonlocal buffered_chunks, buffered_embeddings, buffered_page_states
+        if buffered_chunks:
+            checkpoint.write_shard(state["shard_count"], buffered_chunks, buffered_embeddings)
+            state["shard_count"] += 1
+            state["total_chunks"] += len(buffered_chunks)
+        if buffered_page_states:
+            state["page_states_bytes"] = checkpoint.append_page_states(buffered_page_states)
+            state["page_count"] += len(buffered_page_states)
+        state["stack"] = list(stack)
+        state["visited"] = list(visited)
+        checkpoint.save_state(state)
+        buffered_chunks = []
+        buffered_embeddings = []
+        buffered_page_states = {}
     
-    # 親ページとその子ページを取得
+    # 親ページとその子ページを取得しながら処理
     logger.info(f"親ページ {settings.notion_page_id} の内容を取得しています...")
-    pages = notion.get_parent_page_content()
+    progress = tqdm(desc="ページ処理中", initial=len(visited))
+    # 取得済みだがバッファに入っていないページ（中断時は未処理に戻す）
+    pending_page_id = None
+    try:
+        for page in notion.iter_pages(stack, visited):
+            pending_page_id = page["id"]
+            progress.update(1)
+            title = page["title"]
+            text = page["content"]
+            
+            # 差分同期用にページの更新日時と子ページを記録
+            buffered_page_states[page["id"]] = {
+                "last_edited_time": page["last_edited_time"],
+                "fetched_at": page["fetched_at"],
+                "children": page["children"],
+            }
+            
+            if not text:
+                logger.warning(f"ページ '{title}' にテキストコンテンツがありません。スキップします。")
+            else:
+                # テキストを分割してメタデータを追加して返す
+                chunks = text_processor.split_page(page)
+                
+                # チャンクからテキストと埋め込みを抽出
+                texts = [chunk["content"] for chunk in chunks]
+                embeddings = text_processor.create_embeddings(texts) if chunks else []
+                
+                if not chunks:
+                    logger.warning(f"ページ '{title}' のチャンク分割に失敗しました。スキップします。")
+                elif not embeddings:
+                    logger.warning(f"ページ '{title}' の埋め込み生成に失敗しました。スキップします。")
+                else:
+                    buffered_chunks.extend(chunks)
+                    buffered_embeddings.extend(embeddings)
+            pending_page_id = None
+            
+            if len(buffered_page_states) >= flush_interval:
+                flush()
+    except (Exception, KeyboardInterrupt) as e:
+        if pending_page_id is not None:
+            visited.discard(pending_page_id)
+            stack.append(pending_page_id)
+            buffered_page_states.pop(pending_page_id, None)
+        # 処理済みのページを保存してから中断する
+        flush()
+        logger.error(f"インデックス構築を中断しました: {str(e)}。--resume オプションで続きから再開できます。")
+        return
+    finally:
+        progress.close()
+    
+    flush()
     
-    if not pages:
+    if state["page_count"] == 0:
         logger.error("ページが見つかりませんでした。Notion APIトークンと親ページIDを確認してください。")
         return
     
-    logger.info(f"{len(pages)}個のページが見つかりました。処理を開始します...")
+    if state["total_chunks"] == 0:
+        logger.error("インデックス化するコンテンツがありませんでした。")
+        return
     
-    # 各ページのコンテンツを処理
-    total_chunks = 0
-    for page in tqdm(pages, desc="ページ処理中"):
-        page_id = page["id"]
-        title = page["title"]
-        page_url = page["url"]
-        text = page["content"]
-        
-        if not text:
-            logger.warning(f"ページ '{title}' にテキストコンテンツがありません。スキップします。")
-            continue
-        
-        # メタデータの設定
-        metadata = {
-            "page_id": page_id,
-            "title": title,
-            "url": page_url
-        }
-        
-        # テキストを分割してメタデータを追加して返す
-        chunks = text_processor.split_text(text, metadata)
-        
-        if not chunks:
-            logger.warning(f"ページ '{title}' のチャンク分割に失敗しました。スキップします。")
-            continue
-        
-        # チャンクからテキストと埋め込みを抽出
-        texts = [chunk["content"] for chunk in chunks]
-        embeddings = text_processor.create_embeddings(texts)
-        
-        if not embeddings:
-            logger.warning(f"ページ '{title}' の埋め込み生成に失敗しました。スキップします。")
-            continue
-        
-        # ベクトルストアに追加
+    # シャードをまとめてベクトルストアを構築
+    logger.info(f"{state['shard_count']}個のシャードを結合しています...")
+    vector_store = VectorStore()
+    for chunks, embeddings in checkpoint.iter_shards(state["shard_count"]):
         vector_store.add_documents(chunks, embeddings)
-        total_chunks += len(chunks)
+    vector_store.sync_state = {
+        "pages": checkpoint.load_page_states(state["page_states_bytes"]),
+        "checked_at": state.get("started_at"),
+        "full_scan_at": state.get("started_at"),
+    }
+    
+    # インデックスの種類の変換（次元削減は変換後のインデックスに対して行う）
+    if not vector_store.convert_index(index_type or settings.index_type):
+        logger.error("インデックスの変換に失敗しました。--resume オプションで結合から再実行できます。")
+        return
+    
+    # 次元削減（削減前のベクトルの全件探索との再現率を確認して採用する）
+    if reduction:
+        recall = vector_store.reduce_dimensions(reduction, reduction_dim, min_recall=min_recall)
+        if recall is None:
+            logger.error("次元削減に失敗しました。--resume オプションで結合から再実行できます。")
+            return
     
     # ベクトルストアを保存
-    if total_chunks > 0:
-        if vector_store.save():
-            logger.info(f"インデックスを構築しました。{len(pages)}ページから{total_chunks}個のチャンクがインデックス化されました。")
-        else:
-            logger.error("インデックスの保存に失敗しました。")
+    if vector_store.save():
+        checkpoint.clear()
+        logger.info(f"インデックスを構築しました。{state['page_count']}ページから{state['total_chunks']}個のチャンクがインデックス化されました。")
     else:
-        logger.error("インデックス化するコンテンツがありませんでした。")
+        logger.error("インデックスの保存に失敗しました。--resume オプションで結合から再実行できます。")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Notionページからインデックスを構築するスクリプト")
     parser.add_argument("--force", action="store_true", help="既存のインデックスを上書きする")
+    parser.add_argument("--resume", action="store_true", help="中断したチェックポイントから再開する")
+    parser.add_argument("--flush-interval", type=int, default=50, help="チェックポイントを保存するページ間隔")
+    parser.add_argument("--index-type", type=str, choices=["flat", "hnsw", "ivf"], default=None, help="FAISSインデックスの種類（デフォルトは設定値 INDEX_TYPE）")
+    parser.add_argument("--reduction", type=str, choices=["pca", "truncate"], default=None, help="埋め込みの次元削減の方式（truncateはMatryoshka表現学習のモデル向け）")
+    parser.add_argument("--reduction-dim", type=int, default=128, help="次元削減後の次元数")
+    parser.add_argument("--min-recall", type=float, default=0.0, help="次元削減を採用する最低の再現率@10（下回る場合は削減しない）")
     args = parser.parse_args()
     
     settings = get_settings()
@@ -104,4 +222,11 @@ if __name__ == "__main__":
     # if os.path.exists(index_path) and not args.force:
     #     logger.warning(f"インデックスファイル {index_path} が既に存在します。上書きする場合は --force オプションを使用してください。")
     # else:
-    build_index()
\ No newline at end of file
+    build_index(
+        resume=args.resume,
+        flush_interval=args.flush_interval,
+        index_type=args.index_type,
+        reduction=args.reduction,
+        reduction_dim=args.reduction_dim,
+        min_recall=args.min_recall,
+    )
\ No newline at end of file
@@ -0,0 +1,211 @@
+import argparse
+import itertools
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any
+
+# プロジェクトルートをPythonパスに追加
+project_root = str(Path(__file__).parent.parent.absolute())
+sys.path.insert(0, project_root)
+
+import faiss
+import numpy as np
+
+from app.core.config import get_settings
+from app.core.notion import NotionAPI
+from app.rag.embedding import TextProcessor
+from app.rag.embedding_cache import EmbeddingCache
+from app.rag.vector_store import VectorStore, INDEX_TYPES
+
+# ロギングの設定
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+def normalize_page_id(page_id: str) -> str:
+    return page_id.replace("-", "")
+
+def load_labels(path: str) -> List[Dict[str, Any]]:
+    """
+    正解ラベル付きのクエリを読み込み
+    
+    JSON Lines（1行に1件）またはJSONの配列で、各要素は次の形式:
+        {"query": "VPNの設定方法", "page_ids": ["<正解のページID>", ...]}
+    正解のページが1件の場合は "page_id" でも指定できる。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        items = json.loads(text)
+    else:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    
+    labels = []
+    for item in items:
+        page_ids = item.get("page_ids") or ([item["page_id"]] if item.get("page_id") else [])
+        if not item.get("query") or not page_ids:
+            logger.warning(f"クエリまたは正解のページIDがないためスキップします: {item}")
+            continue
+        labels.append({"query": item["query"], "page_ids": {normalize_page_id(page_id) for page_id in page_ids}})
+    return labels
+
+def crawl_pages(root_page_id: str) -> List[Dict[str, Any]]:
+    """親ページ以下のページをすべて取得（NOTION_CACHE_MODE=replay の場合はキャッシュから読み込む）"""
+    notion = NotionAPI()
+    pages = [page for page in notion.iter_pages([root_page_id], set()) if page["content"]]
+    logger.info(f"{len(pages)}ページを取得しました")
+    return pages
+
+def build_chunks(text_processor: TextProcessor, pages: List[Dict[str, Any]], chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    """指定したチャンクサイズ・オーバーラップで全ページを分割"""
+    text_processor.text_splitter = text_processor.create_text_splitter(chunk_size, chunk_overlap)
+    chunks = []
+    for page in pages:
+        chunks.extend(text_processor.split_page(page))
+    return chunks
+
+def evaluate_store(vector_store: VectorStore, labels: List[Dict[str, Any]], query_embeddings: np.ndarray, top_k: int) -> Dict[str, Any]:
+    """
+    クエリごとに検索し、再現率@k・MRR・検索レイテンシを計算
+    
+    再現率@kは上位k件のチャンクに含まれる正解ページの割合、MRRは最初に正解ページのチャンクが現れた順位の逆数の平均
+    """
+    recalls = []
+    reciprocal_ranks = []
+    latencies = []
+    for label, query_embedding in zip(labels, query_embeddings):
+        search_start = time.perf_counter()
+        docs, _ = vector_store.similarity_search(query_embedding, k=top_k)
+        latencies.append(time.perf_counter() - search_start)
+        
+        retrieved = [normalize_page_id(doc["metadata"]["page_id"]) for doc in docs]
+        relevant = label["page_ids"]
+        recalls.append(len(relevant & set(retrieved)) / len(relevant))
+        rank = next((i for i, page_id in enumerate(retrieved, 1) if page_id in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    latencies_ms = np.array(latencies) * 1000
+    
+    return {
+        "recall_at_k": float(np.mean(recalls)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "latency_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "latency_p95_ms": float(np.percentile(latencies_ms, 95)),
+    }
+
+def run_evaluation(args: argparse.Namespace) -> Dict[str, Any]:
+    """パラメータの全組み合わせでインデックスを構築して評価"""
+    settings = get_settings()
+    labels = load_labels(args.labels)
+    if not labels:
+        raise ValueError(f"評価用のクエリがありません: {args.labels}")
+    
+    if settings.notion_cache_mode == "off":
+        logger.warning("Notionキャッシュが無効のため、Notion APIからページを取得します。NOTION_CACHE_MODE=record で一度取得しておくと、replay で再利用できます。")
+    
+    text_processor = TextProcessor()
+    embedding_cache = EmbeddingCache(args.embedding_cache, settings.embedding_model)
+    
+    # クロールとクエリの埋め込みはすべての組み合わせで共通
+    pages = crawl_pages(settings.notion_page_id)
+    query_embeddings = np.array(text_processor.embed_queries([label["query"] for label in labels]), dtype=np.float32)
+    
+    results = []
+    try:
+        for chunk_size, chunk_overlap in itertools.product(args.chunk_sizes, args.chunk_overlaps):
+            if chunk_overlap >= chunk_size:
+                logger.warning(f"オーバーラップ {chunk_overlap} がチャンクサイズ {chunk_size} 以上のためスキップします")
+                continue
+            
+            # チャンク分割と埋め込み（同じ本文のチャンクはキャッシュから取得）
+            start = time.perf_counter()
+            chunks = build_chunks(text_processor, pages, chunk_size, chunk_overlap)
+            chunk_seconds = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            embeddings = embedding_cache.embed([chunk["content"] for chunk in chunks], text_processor.create_embeddings)
+            embed_seconds = time.perf_counter() - start
+            if len(embeddings) != len(chunks):
+                logger.error(f"埋め込みの生成に失敗したためスキップします（chunk_size={chunk_size}, chunk_overlap={chunk_overlap}）")
+                continue
+            
+            for index_type in args.index_types:
+                start = time.perf_counter()
+                vector_store = VectorStore()
+                vector_store.add_documents(chunks, embeddings)
+                if not vector_store.convert_index(index_type):
+                    continue
+                index_seconds = time.perf_counter() - start
+                index_bytes = len(faiss.serialize_index(vector_store.index)) + vector_store.chunks.nbytes()
+                
+                for top_k in args.top_k:
+                    metrics = evaluate_store(vector_store, labels, query_embeddings, top_k)
+                    results.append({
+                        "chunk_size": chunk_size,
+                        "chunk_overlap": chunk_overlap,
+                        "index_type": index_type,
+                        "top_k": top_k,
+                        **metrics,
+                        "chunks": len(chunks),
+                        "index_mb": index_bytes / (1024 * 1024),
+                        "build_s": chunk_seconds + embed_seconds + index_seconds,
+                        "embed_s": embed_seconds,
+                        "index_build_s": index_seconds,
+                    })
+                    logger.info(
+                        f"chunk_size={chunk_size} chunk_overlap={chunk_overlap} index={index_type} top_k={top_k}: "
+                        f"recall@k={metrics['recall_at_k']:.3f} MRR={metrics['mrr']:.3f} p50={metrics['latency_p50_ms']:.2f}ms"
+                    )
+    finally:
+        embedding_cache.close()
+    
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "embedding_model": settings.embedding_model,
+        "labels": args.labels,
+        "queries": len(labels),
+        "pages": len(pages),
+        "results": results,
+    }
+
+def format_table(results: List[Dict[str, Any]]) -> str:
+    """評価結果を再現率・MRRの高い順に表形式で出力"""
+    columns = [
+        ("chunk_size", "{}"), ("chunk_overlap", "{}"), ("index_type", "{}"), ("top_k", "{}"),
+        ("recall_at_k", "{:.3f}"), ("mrr", "{:.3f}"), ("chunks", "{}"), ("index_mb", "{:.2f}"),
+        ("build_s", "{:.1f}"), ("latency_p50_ms", "{:.3f}"), ("latency_p95_ms", "{:.3f}"),
+    ]
+    rows = [[name for name, _ in columns]]
+    for result in sorted(results, key=lambda r: (-r["recall_at_k"], -r["mrr"], r["latency_p50_ms"])):
+        rows.append([fmt.format(result[name]) for name, fmt in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    return "\n".join("  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows)
+
+def parse_list(value_type):
+    def parse(value: str):
+        return [value_type(item) for item in value.split(",") if item]
+    return parse
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="正解ラベル付きのクエリでチャンク分割・検索の設定を評価するスクリプト")
+    parser.add_argument("labels", type=str, help="正解ラベル付きのクエリファイル（JSON Lines）")
+    parser.add_argument("--chunk-sizes", type=parse_list(int), default=[200, 300, 500], help="チャンクサイズの候補（カンマ区切り）")
+    parser.add_argument("--chunk-overlaps", type=parse_list(int), default=[30, 50], help="チャンクのオーバーラップの候補（カンマ区切り）")
+    parser.add_argument("--top-k", type=parse_list(int), default=[3, 5, 10], help="検索件数の候補（カンマ区切り）")
+    parser.add_argument("--index-types", type=parse_list(str), default=list(INDEX_TYPES), help="FAISSインデックスの種類の候補（カンマ区切り）")
+    parser.add_argument("--embedding-cache", type=str, default="data/embedding_cache.sqlite3", help="埋め込みキャッシュのパス")
+    parser.add_argument("--output", type=str, default=None, help="結果のJSONを書き出すパス")
+    args = parser.parse_args()
+    
+    evaluation = run_evaluation(args)
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(evaluation, f, ensure_ascii=False, indent=2)
+        logger.info(f"評価結果を {args.output} に書き出しました")
+    print(format_table(evaluation["results"]))
@@ -0,0 +1,135 @@
+import argparse
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import Optional
+
+# ロギングの設定
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+class FakeOllamaServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, tokens: int = 50,
+                 token_latency: float = 0.01, first_token_latency: float = 0.05):
+        """
+        Ollamaの /api/chat を模したベンチマーク用のスタブサーバー
+        
+        Args:
+            host: 待ち受けるホスト
+            port: 待ち受けるポート（0の場合は空いているポート）
+            tokens: 1回の応答で生成するトークン数
+            token_latency: 1トークンあたりの生成時間（秒）
+            first_token_latency: 最初のトークンまでの時間（秒）
+        """
+        self.tokens = tokens
+        self.token_latency = token_latency
+        self.first_token_latency = first_token_latency
+        self.server = ThreadingHTTPServer((host, port), self._create_handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[Thread] = None
+    
+    @property
+    def api_base(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api"
+    
+    def _create_handler(self):
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+            
+            def do_POST(self):
+                if self.path != "/api/chat":
+                    self.send_error(404)
+                    return
+                
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                model = body.get("model", "fake")
+                stream = body.get("stream", True)
+                # 実際のトークナイザーの代わりに、日本語で1〜2文字が1トークン程度であることから2文字を1トークンと見積もる
+                prompt_chars = sum(len(message.get("content", "")) for message in body.get("messages", []))
+                prompt_tokens = max(1, (prompt_chars + 1) // 2)
+                start = time.perf_counter()
+                
+                def chunk(content: str, done: bool) -> dict:
+                    message = {
+                        "model": model,
+                        "created_at": datetime.now(timezone.utc).isoformat(),
+                        "message": {"role": "assistant", "content": content},
+                        "done": done,
+                    }
+                    if done:
+                        elapsed_ns = int((time.perf_counter() - start) * 1e9)
+                        message.update({
+                            "done_reason": "stop",
+                            "total_duration": elapsed_ns,
+                            "prompt_eval_count": prompt_tokens,
+                            "prompt_eval_duration": int(fake.first_token_latency * 1e9),
+                            "eval_count": fake.tokens,
+                            "eval_duration": elapsed_ns,
+                        })
+                    return message
+                
+                time.sleep(fake.first_token_latency)
+                
+                if stream:
+                    # OllamaのストリーミングはNDJSONで1トークンずつ返す
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.end_headers()
+                    for i in range(fake.tokens):
+                        if i > 0:
+                            time.sleep(fake.token_latency)
+                        self.wfile.write((json.dumps(chunk(f"token{i} ", False)) + "\n").encode("utf-8"))
+                        self.wfile.flush()
+                    self.wfile.write((json.dumps(chunk("", True)) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                else:
+                    time.sleep(fake.token_latency * max(fake.tokens - 1, 0))
+                    content = "".join(f"token{i} " for i in range(fake.tokens))
+                    payload = json.dumps(chunk(content, True)).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+        
+        return Handler
+    
+    def start(self) -> None:
+        """バックグラウンドでサーバーを起動"""
+        self._thread = Thread(target=self.server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        logger.info(f"スタブOllamaサーバーを起動しました: {self.api_base}")
+    
+    def stop(self) -> None:
+        """サーバーを停止"""
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ollamaの /api/chat を模したスタブサーバー")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="待ち受けるホスト")
+    parser.add_argument("--port", type=int, default=11434, help="待ち受けるポート")
+    parser.add_argument("--tokens", type=int, default=50, help="1回の応答で生成するトークン数")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="1トークンあたりの生成時間（秒）")
+    parser.add_argument("--first-token-latency", type=float, default=0.05, help="最初のトークンまでの時間（秒）")
+    args = parser.parse_args()
+    
+    server = FakeOllamaServer(args.host, args.port, args.tokens, args.token_latency, args.first_token_latency)
+    logger.info(f"スタブOllamaサーバーを起動します: {server.api_base}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.server.server_close()
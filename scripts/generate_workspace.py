@@ -0,0 +1,45 @@
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+project_root = str(Path(__file__).parent.parent.absolute())
+sys.path.insert(0, project_root)
+
+from app.core.config import NotionCacheSettings
+from app.core.notion_cache import NotionResponseStore
+from app.core.synthetic_workspace import generate_workspace
+
+# ロギングの設定
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="合成したNotionワークスペースをレスポンスキャッシュに書き込むスクリプト")
+    parser.add_argument("--pages", type=int, default=100, help="ページ数")
+    parser.add_argument("--depth", type=int, default=3, help="ページ階層の最大の深さ")
+    parser.add_argument("--blocks-per-page", type=int, default=20, help="1ページあたりのブロック数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--output", type=str, default=None, help="出力先（デフォルトは NOTION_CACHE_PATH）")
+    args = parser.parse_args()
+    
+    # 出力先の既定値だけを読み込む（NOTION_TOKENがなくても生成できるように）
+    output = args.output or NotionCacheSettings().notion_cache_path
+    store = NotionResponseStore(output)
+    root_id = generate_workspace(
+        store,
+        page_count=args.pages,
+        max_depth=args.depth,
+        blocks_per_page=args.blocks_per_page,
+        seed=args.seed,
+    )
+    store.close()
+    
+    logger.info(f"合成ワークスペースを {output} に書き込みました")
+    print(f"NOTION_PAGE_ID={root_id}")
+    print("NOTION_CACHE_MODE=replay")
+    print(f"NOTION_CACHE_PATH={output}")